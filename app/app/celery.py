@@ -1,9 +1,53 @@
 import os
+import tempfile
 
 from celery import Celery
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_init, worker_process_shutdown, \
+    worker_ready
+
+# The exporter of the worker master serves the samples of its prefork children, which they write to disk.
+# prometheus_client reads the directory on import, so it is set first. gunicorn has set its own for the web.
+if os.environ.get('CELERY_METRICS_PORT'):
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus-celery'))
+
+from app import metrics  # noqa: E402
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 app = Celery('app')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@before_task_publish.connect
+def on_task_publish(headers=None, **kwargs):
+    if headers is not None:
+        metrics.task_published(headers)
+
+
+@task_prerun.connect
+def on_task_prerun(task=None, **kwargs):
+    metrics.task_started(task)
+
+
+@task_postrun.connect
+def on_task_postrun(task=None, state=None, **kwargs):
+    metrics.task_finished(task, state)
+
+
+@worker_init.connect
+def on_worker_init(**kwargs):
+    if os.environ.get('CELERY_METRICS_PORT') and 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        metrics.reset_multiproc_dir(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(pid=None, **kwargs):
+    metrics.worker_process_exited(pid)
+
+
+@worker_ready.connect
+def on_worker_ready(**kwargs):
+    port = os.environ.get('CELERY_METRICS_PORT')
+    if port:
+        metrics.start_exporter(int(port))
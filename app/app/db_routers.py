@@ -0,0 +1,154 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+# Where reads of the current request or task go, None keeps Django's default database.
+read_target: ContextVar[Optional[str]] = ContextVar('read_target', default=None)
+# Database alias of the team the current request or task works on, see `workspace.sharding`.
+current_shard: ContextVar[Optional[str]] = ContextVar('current_shard', default=None)
+
+
+def set_read_target(target: str):
+    """ returns the token for `read_target.reset`, a primary target is never downgraded to a replica """
+    if target == REPLICA and read_target.get() == PRIMARY:
+        target = PRIMARY
+    return read_target.set(target)
+
+
+@contextmanager
+def use_replica():
+    """ send reads to a replica, unless an outer block already pinned them to the primary """
+    token = set_read_target(REPLICA)
+    try:
+        yield
+    finally:
+        read_target.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """ send reads to the primary, for anything that is cached or written back """
+    token = set_read_target(PRIMARY)
+    try:
+        yield
+    finally:
+        read_target.reset(token)
+
+
+@contextmanager
+def use_shard(alias: str):
+    """ send queries of sharded models to `alias` """
+    token = current_shard.set(alias)
+    try:
+        yield
+    finally:
+        current_shard.reset(token)
+
+
+def get_shard() -> str:
+    return current_shard.get() or DEFAULT_DB_ALIAS
+
+
+def is_sharded(model) -> bool:
+    """ whether rows of `model`, or of a multi-table parent of it, are partitioned by team """
+    sharded = settings.TENANT_SHARDED_MODELS
+    return any(m._meta.label_lower in sharded for m in (model, *model._meta.get_parent_list()))
+
+
+def _sticky_key(user_id) -> str:
+    return f'replica-sticky:{user_id}'
+
+
+def stick_to_primary(user_id) -> None:
+    """ read the user's own writes back from the primary until the replicas caught up """
+    if user_id and settings.DATABASE_REPLICAS:
+        cache.set(_sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id) -> bool:
+    return bool(user_id and settings.DATABASE_REPLICAS and cache.get(_sticky_key(user_id)))
+
+
+class ReplicaRouter:
+    """
+        Reads inside `use_replica()` go to one of `settings.DATABASE_REPLICAS`, everything else to `default`.
+        Reads inside a transaction stay on `default` so they see its uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or read_target.get() != REPLICA:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Django writes an instance back to the database it was read from, never let that be a replica.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class TenantShardRouter:
+    """
+        Sharded models go to the shard entered with `use_shard()`, or stay with the instance they relate to.
+        Global models always go to `default` while a shard is active, so relations like `workspace.team`
+        do not follow the workspace to its shard. The `default` shard is left to `ReplicaRouter`.
+    """
+
+    def _db_for_model(self, model, hints):
+        shard = current_shard.get()
+        instance = hints.get('instance')
+        instance_db = instance._state.db if instance is not None else None
+        if is_sharded(model):
+            if shard and shard != DEFAULT_DB_ALIAS:
+                return shard
+            if not shard and instance_db in settings.TENANT_SHARDS and instance_db != DEFAULT_DB_ALIAS:
+                return instance_db
+            return None
+        if (shard and shard != DEFAULT_DB_ALIAS) or (instance_db and instance_db != DEFAULT_DB_ALIAS):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_model(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows reference global rows on `default` by id, without a database constraint.
+        databases = {DEFAULT_DB_ALIAS, *settings.TENANT_SHARDS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in settings.TENANT_SHARDS:
+            return None
+        model = hints.get('model')
+        if model is None and model_name:
+            try:
+                model = apps.get_model(app_label, model_name)
+            except LookupError:
+                return f'{app_label}.{model_name}' in settings.TENANT_SHARDED_MODELS
+        # Other shards only hold the sharded tables.
+        return model is not None and is_sharded(model)
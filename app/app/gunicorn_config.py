@@ -0,0 +1,135 @@
+"""
+gunicorn configuration of the web process, used as `gunicorn -c python:app.gunicorn_config`.
+
+Everything can be overridden from the environment:
+
+    GUNICORN_WORKER_CLASS   sync (default), gthread or asgi (uvicorn workers on `app.asgi`)
+    GUNICORN_PROFILE        io (default) for requests waiting on the database or APIs, cpu for compute-bound ones
+    WEB_CONCURRENCY         number of workers, sized from the CPU count otherwise
+    GUNICORN_THREADS        threads per gthread worker
+    GUNICORN_MAX_MEMORY_MB  restart a worker once its resident memory grows past this, 0 disables it
+    GUNICORN_PRELOAD        1 (default) loads the app in the master, workers share it copy-on-write
+    PROMETHEUS_MULTIPROC_DIR where workers write their metrics for `/metrics` to aggregate, under
+                            `worker_tmp_dir` by default and emptied on every start
+"""
+import gc
+import os
+import tempfile
+from typing import Optional
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+PROFILES = ('io', 'cpu')
+
+
+def cpu_count() -> int:
+    """ CPUs this process may run on, which is less than the host's inside a restricted container """
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count(worker_class: str, profile: str, cpus: int) -> int:
+    """
+        sync workers serve one request each, so I/O-bound traffic gets the classic 2 * CPUs + 1.
+        Threaded and ASGI workers multiplex requests themselves and need about one process per CPU.
+    """
+    if worker_class == 'sync' and profile == 'io':
+        return 2 * cpus + 1
+    return cpus + 1 if worker_class == 'gthread' else cpus
+
+
+def thread_count(worker_class: str, profile: str) -> int:
+    if worker_class != 'gthread':
+        return 1
+    # Threads only overlap while waiting, the GIL serializes compute-bound requests.
+    return 4 if profile == 'io' else 2
+
+
+def resident_memory_mb() -> Optional[float]:
+    """ current resident set size of this process, None where /proc is not available """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if _worker_class not in WORKER_CLASSES:
+    raise ValueError(f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}, not {_worker_class}.')
+_profile = os.environ.get('GUNICORN_PROFILE', 'io')
+if _profile not in PROFILES:
+    raise ValueError(f'GUNICORN_PROFILE must be one of {", ".join(PROFILES)}, not {_profile}.')
+
+wsgi_app = 'app.asgi:application' if _worker_class == 'asgi' else 'app.wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = WORKER_CLASSES[_worker_class]
+workers = int(os.environ.get('WEB_CONCURRENCY', worker_count(_worker_class, _profile, cpu_count())))
+threads = int(os.environ.get('GUNICORN_THREADS', thread_count(_worker_class, _profile)))
+preload_app = bool(int(os.environ.get('GUNICORN_PRELOAD', 1)))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Heartbeat files on tmpfs, a disk-backed /tmp in a container can block workers long enough to be killed.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+# A request count backstop for the ASGI workers, which never call `post_request`.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+max_memory_mb = int(os.environ.get('GUNICORN_MAX_MEMORY_MB', 512))
+
+# gunicorn sets `raw_env` before it loads the app, prometheus_client reads it on import.
+prometheus_multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR') \
+    or os.path.join(worker_tmp_dir or tempfile.gettempdir(), 'prometheus-web')
+raw_env = [f'PROMETHEUS_MULTIPROC_DIR={prometheus_multiproc_dir}']
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Samples of workers from a previous run would be summed into the new ones.
+    from app.metrics import reset_multiproc_dir
+    reset_multiproc_dir(prometheus_multiproc_dir)
+
+
+def when_ready(server):
+    # Django only imports the URLconf, and with it the views, serializers and services, on the first request.
+    # Import it in the master so forked workers start with it instead of each importing it again.
+    if preload_app:
+        from django.urls import get_resolver
+        get_resolver().url_patterns
+
+
+def pre_fork(server, worker):
+    # Move the preloaded app out of the collector's reach, collections in the workers would otherwise
+    # write to every object header and copy the shared pages.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading belong to the master, a worker must not share its sockets.
+    from django.db import connections
+    connections.close_all()
+
+
+def post_request(worker, req, environ, resp):
+    """ finish the worker gracefully after a request that left it above `max_memory_mb` """
+    if not max_memory_mb or not worker.alive:
+        return
+    memory = resident_memory_mb()
+    if memory is not None and memory > max_memory_mb:
+        worker.log.info('Worker %s uses %.0f MB, above %s MB, restarting.', worker.pid, memory, max_memory_mb)
+        worker.alive = False
+
+
+def child_exit(server, worker):
+    from app.metrics import child_exit
+    child_exit(server, worker)
@@ -0,0 +1,64 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+current_metrics: ContextVar[Optional['RequestMetrics']] = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """ counters of one request, filled by the SQL execute_wrapper and the caches """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.view_started = None
+        self.view_finished = None
+        self.finished = None
+        self.action = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    @property
+    def view_time(self) -> Optional[float]:
+        if self.view_started is None:
+            return None
+        return (self.view_finished or self.finished or time.perf_counter()) - self.view_started
+
+    @property
+    def render_time(self) -> Optional[float]:
+        if self.view_finished is None:
+            return None
+        return (self.finished or time.perf_counter()) - self.view_finished
+
+    @property
+    def total_time(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+
+def record_cache_access(hit: bool) -> None:
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def view_action_name(view_func, method: str) -> Optional[str]:
+    """ `WorkspaceViewSet.list` style name of a DRF view, the function name for plain views """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
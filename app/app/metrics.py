@@ -0,0 +1,113 @@
+"""
+Prometheus metrics of the web and Celery processes.
+
+With several pre-forked processes (gunicorn workers, Celery prefork pool) every
+process writes its samples to `PROMETHEUS_MULTIPROC_DIR` and `/metrics` aggregates
+them. `app.gunicorn_config` sets it for the web workers, `app.celery` for a worker
+started with `CELERY_METRICS_PORT`. It has to be set before prometheus_client is imported.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency per view action.',
+    ['action', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries per request.', ['action'], buckets=QUERY_BUCKETS,
+)
+REQUEST_QUERY_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL per request.', ['action'], buckets=LATENCY_BUCKETS,
+)
+TASK_RUNTIME = Histogram(
+    'celery_task_duration_seconds', 'Celery task runtime.', ['task', 'state'], buckets=LATENCY_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Time between publishing a task and a worker starting it.',
+    ['task'], buckets=LATENCY_BUCKETS,
+)
+QUOTA_CHECKS = Counter(
+    'workspace_quota_checks', 'Outcomes of WorkspaceService quota checks.', ['check', 'outcome'],
+)
+
+
+def record_quota_check(check: str, allowed: bool) -> bool:
+    QUOTA_CHECKS.labels(check=check, outcome='allowed' if allowed else 'denied').inc()
+    return allowed
+
+
+def observe_request(action: str, method: str, status: int, duration: float, sql_count: int, sql_time: float):
+    action = action or 'unknown'
+    REQUEST_LATENCY.labels(action=action, method=method, status=status).observe(duration)
+    REQUEST_QUERIES.labels(action=action).observe(sql_count)
+    REQUEST_QUERY_TIME.labels(action=action).observe(sql_time)
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """ the registry for scrapers sending `Bearer <METRICS_TOKEN>`, without a token it is only served in DEBUG """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token and not settings.DEBUG:
+        raise Http404()
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def reset_multiproc_dir(path: str) -> None:
+    """ create the multiprocess directory and drop the samples of processes from a previous start """
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith('.db'):
+            os.remove(os.path.join(path, name))
+
+
+def child_exit(server, worker):
+    """ gunicorn `child_exit` hook, drops the live samples of a dead worker """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_process_exited(pid: int):
+    """ Celery `worker_process_shutdown`, drops the live samples of a prefork child """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def start_exporter(port: int):
+    """ serve the aggregated registry from a process without a web server, e.g. the Celery master """
+    start_http_server(port, registry=get_registry())
+
+
+def task_published(headers: dict):
+    headers.setdefault('published_at', time.time())
+
+
+def task_started(task):
+    task.request._metrics_started = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at:
+        TASK_QUEUE_WAIT.labels(task=task.name).observe(max(time.time() - published_at, 0))
+
+
+def task_finished(task, state: str):
+    started = getattr(task.request, '_metrics_started', None)
+    if started is not None:
+        TASK_RUNTIME.labels(task=task.name, state=state or 'UNKNOWN').observe(time.perf_counter() - started)
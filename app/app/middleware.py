@@ -0,0 +1,107 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from app import metrics as prometheus
+from app.instrumentation import RequestMetrics, current_metrics, view_action_name
+
+logger = logging.getLogger('app.performance')
+
+
+class PerformanceMiddleware:
+    """
+        Per-request SQL, cache, view and render timings, sent as `Server-Timing` headers
+        and structured log lines for a sample of the requests.
+        Requests slower than `SLOW_REQUEST_MS` are always logged and, with `METRICS`,
+        every request is observed by the Prometheus histograms.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'PERFORMANCE_INSTRUMENTATION', {})
+        self.sample_rate = float(config.get('SAMPLE_RATE', 0))
+        self.slow_request_ms = float(config.get('SLOW_REQUEST_MS', 1000))
+        self.server_timing = config.get('SERVER_TIMING', True)
+        self.metrics = config.get('METRICS', False)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        request.performance_metrics = metrics
+        token = current_metrics.set(metrics)
+        try:
+            if sampled or self.metrics:
+                with self.wrap_connections(metrics):
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        finally:
+            metrics.finished = time.perf_counter()
+            current_metrics.reset(token)
+
+        total_ms = metrics.total_time * 1000
+        slow = total_ms >= self.slow_request_ms
+        if sampled and self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(metrics, total_ms)
+        if sampled or slow:
+            self.log(request, response, metrics, total_ms, sampled, slow)
+        if self.metrics:
+            prometheus.observe_request(metrics.action, request.method, response.status_code, metrics.total_time,
+                                       metrics.sql_count, metrics.sql_time)
+        return response
+
+    @staticmethod
+    def wrap_connections(metrics):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'performance_metrics', None)
+        if metrics:
+            metrics.action = view_action_name(view_func, request.method)
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called right before rendering, what follows is serialization of the response.
+        metrics = getattr(request, 'performance_metrics', None)
+        if metrics:
+            metrics.view_finished = time.perf_counter()
+        return response
+
+    @staticmethod
+    def server_timing_header(metrics, total_ms):
+        entries = [
+            f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.sql_count} queries"',
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+        ]
+        if metrics.view_time is not None:
+            entries.append(f'view;dur={metrics.view_time * 1000:.2f}')
+        if metrics.render_time is not None:
+            entries.append(f'render;dur={metrics.render_time * 1000:.2f}')
+        entries.append(f'total;dur={total_ms:.2f}')
+        return ', '.join(entries)
+
+    @staticmethod
+    def log(request, response, metrics, total_ms, sampled, slow):
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'action': metrics.action,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'view_ms': round(metrics.view_time * 1000, 2) if metrics.view_time is not None else None,
+            'render_ms': round(metrics.render_time * 1000, 2) if metrics.render_time is not None else None,
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'slow': slow,
+        }
+        if sampled:
+            line.update({'sql_count': metrics.sql_count, 'sql_ms': round(metrics.sql_time * 1000, 2)})
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(line))
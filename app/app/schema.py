@@ -0,0 +1,121 @@
+"""
+OpenAPI schema of the API, generated once instead of on every hit of the swagger UI.
+
+`manage.py build_schema` writes the JSON to `settings.OPENAPI_SCHEMA_PATH`, which the JSON view and the
+swagger UI load. A process without the file generates the schema on first use.
+`settings.OPENAPI_SCHEMA_LIVE` regenerates it on every request while developing.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+API_INFO = openapi.Info(
+    title="Social Media Automation Platform API",
+    default_version='v1',
+    description="API for Social Media Automation Platform",
+)
+
+
+class EncodedSchema(NamedTuple):
+    content: bytes
+    etag: str
+
+    @classmethod
+    def from_content(cls, content: bytes) -> 'EncodedSchema':
+        return cls(content, f'"{hashlib.sha256(content).hexdigest()}"')
+
+
+def generate_swagger() -> openapi.Swagger:
+    # Public and without a request: the schema is the same for every visitor and can be shared.
+    return OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+
+
+def encode_swagger(swagger: openapi.Swagger) -> EncodedSchema:
+    return EncodedSchema.from_content(OpenAPICodecJson(validators=[]).encode(swagger))
+
+
+def decode_swagger(content: bytes) -> openapi.Swagger:
+    """ a `Swagger` of stored JSON, nested objects stay plain dicts except the info the swagger UI reads """
+    spec = json.loads(content, object_pairs_hook=OrderedDict)
+    swagger = openapi.Swagger.__new__(openapi.Swagger)
+    openapi.SwaggerDict.__init__(swagger)
+    swagger.update(spec)
+    swagger['info'] = info = openapi.SwaggerDict()
+    info.update(spec.get('info') or {})
+    info.setdefault('title', API_INFO.title)
+    info.setdefault('version', API_INFO._default_version)
+    return swagger
+
+
+def read_schema(path) -> Optional[EncodedSchema]:
+    try:
+        return EncodedSchema.from_content(Path(path).read_bytes())
+    except (OSError, TypeError):
+        return None
+
+
+def write_schema(path) -> EncodedSchema:
+    schema = encode_swagger(generate_swagger())
+    Path(path).write_bytes(schema.content)
+    return schema
+
+
+class SchemaStore:
+    """ the schema of this process, the `Swagger` object the swagger UI renders and its JSON encoding """
+    lock = threading.RLock()
+    swagger: Optional[openapi.Swagger] = None
+    encoded: Optional[EncodedSchema] = None
+
+    @staticmethod
+    def get_swagger() -> openapi.Swagger:
+        with SchemaStore.lock:
+            if SchemaStore.swagger is None:
+                stored = read_schema(settings.OPENAPI_SCHEMA_PATH)
+                SchemaStore.swagger = decode_swagger(stored.content) if stored else generate_swagger()
+            return SchemaStore.swagger
+
+    @staticmethod
+    def get_encoded() -> EncodedSchema:
+        with SchemaStore.lock:
+            if SchemaStore.encoded is None:
+                SchemaStore.encoded = read_schema(settings.OPENAPI_SCHEMA_PATH) \
+                    or encode_swagger(SchemaStore.get_swagger())
+            return SchemaStore.encoded
+
+    @staticmethod
+    def clear() -> None:
+        with SchemaStore.lock:
+            SchemaStore.swagger = None
+            SchemaStore.encoded = None
+
+
+class CachedSchemaGenerator(OpenAPISchemaGenerator):
+    """ generator of the swagger UI view, hands out the schema of `SchemaStore` unless it is live """
+
+    def get_schema(self, request=None, public=False):
+        if settings.OPENAPI_SCHEMA_LIVE:
+            return super(CachedSchemaGenerator, self).get_schema(request, public)
+        return SchemaStore.get_swagger()
+
+
+@require_safe
+def schema_view(request):
+    """ the schema as JSON with a content hash ETag, clients revalidate it with a cheap 304 """
+    schema = encode_swagger(generate_swagger()) if settings.OPENAPI_SCHEMA_LIVE else SchemaStore.get_encoded()
+    response = get_conditional_response(request, etag=schema.etag)
+    if response is None:
+        response = HttpResponse(schema.content, content_type='application/json')
+    response['ETag'] = schema.etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,6 +101,71 @@ else:
 
     }
 
+# Read replicas, used by `app.db_routers.ReplicaRouter` for reads inside `use_replica()`.
+# Locally, LOCAL_REPLICA=1 adds a second SQLite file as a stand-in: `cp db.sqlite3 db.replica.sqlite3`.
+DATABASE_REPLICAS = []
+if os.environ.get("IS_LOCAL"):
+    if os.environ.get("LOCAL_REPLICA"):
+        DATABASE_REPLICAS = ["replica"]
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(BASE_DIR, "db.replica.sqlite3"),
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    for index, host in enumerate(filter(None, os.environ.get("SQL_REPLICA_HOSTS", "").split(",")), start=1):
+        DATABASE_REPLICAS.append(f"replica_{index}")
+        DATABASES[f"replica_{index}"] = {**DATABASES["default"], "HOST": host.strip(), "TEST": {"MIRROR": "default"}}
+
+# Databases holding the workspaces, roles and social media accounts of teams, see `workspace.sharding`.
+# The shard map and every other table stay on `default`, teams without a map entry live there too.
+# Locally, LOCAL_SHARDS=2 adds `shard_1` as a second SQLite file, `migrate --database shard_1` creates it.
+TENANT_SHARDS = ["default"]
+if os.environ.get("IS_LOCAL"):
+    for index in range(1, int(os.environ.get("LOCAL_SHARDS", 1))):
+        TENANT_SHARDS.append(f"shard_{index}")
+        DATABASES[f"shard_{index}"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(BASE_DIR, f"db.shard_{index}.sqlite3"),
+        }
+else:
+    # SQL_SHARDS="shard_1=host1,shard_2=host2"
+    for shard in filter(None, os.environ.get("SQL_SHARDS", "").split(",")):
+        alias, host = shard.split("=", 1)
+        TENANT_SHARDS.append(alias.strip())
+        DATABASES[alias.strip()] = {**DATABASES["default"], "HOST": host.strip()}
+TENANT_SHARDED_MODELS = [
+    "workspace.workspace",
+    "workspace.workspacerole",
+    "workspace.historicalworkspacerole",
+    "social_media.socialmediaaccount",
+]
+DATABASE_ROUTERS = ['app.db_routers.TenantShardRouter', 'app.db_routers.ReplicaRouter']
+# Seconds a user's reads stay on the primary after the user's own write.
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+# Responses of workspace writes sent with an Idempotency-Key header are replayed to repeats for this many seconds.
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+# A duplicate waits this long for the first request to finish, which holds its lock at most IDEMPOTENCY_LOCK_SECONDS.
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 10))
+# gunicorn kills a worker GUNICORN_TIMEOUT seconds into a request, the lock outlives the longest request.
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS",
+                                              int(os.environ.get("GUNICORN_TIMEOUT", 30)) + 30))
+
+if os.environ.get("IS_LOCAL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_CACHE_URL", "redis://redis:6379/1"),
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -134,10 +200,21 @@ LOGIN_REDIRECT_URL = os.environ.get('LOGIN_REDIRECT_URL')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'workspace.authentication.CachedTokenAuthentication',
+    ],
+    # orjson when installed, the stdlib json module otherwise.
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'app.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 AUTH_USER_MODEL = 'core.User'
+AUTH_TOKEN_CACHE_TIMEOUT = 300
 ACCOUNT_TEMPLATE_EXTENSION = "html"
 ACCOUNT_EMAIL_CONFIRMATION_TEMPLATE = 'account/email/email_confirmation.html'
 ACCOUNT_USER_MODEL_USERNAME_FIELD = None
@@ -171,7 +248,12 @@ SWAGGER_SETTINGS = {
         }
     },
     'DEFAULT_API_URL': BACKEND_URL,
+    'SPEC_URL': 'openapi-schema',
 }
+# The swagger schema is built once per process, or read from OPENAPI_SCHEMA_PATH written by `manage.py build_schema`.
+# OPENAPI_SCHEMA_LIVE regenerates it on every request instead, for development.
+OPENAPI_SCHEMA_LIVE = bool(int(os.environ.get("OPENAPI_SCHEMA_LIVE", int(DEBUG))))
+OPENAPI_SCHEMA_PATH = os.environ.get("OPENAPI_SCHEMA_PATH", os.path.join(BASE_DIR, 'openapi.json'))
 
 SUBSCRIPTION_SETTINGS = {
     "STRIPE_API_SECRET": os.environ.get("STRIPE_TEST_SECRET_KEY"),
@@ -185,6 +267,51 @@ SUBSCRIPTION_SETTINGS = {
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-team-usage': {
+        'task': 'workspace.tasks.reconcile_team_usage',
+        'schedule': 60 * 60,
+    },
+    'rebuild-entitlements': {
+        'task': 'workspace.tasks.rebuild_entitlements',
+        'schedule': 60 * 60,
+    },
+}
+
+PERFORMANCE_INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get("PERFORMANCE_SAMPLE_RATE", 0.01)),
+    'SLOW_REQUEST_MS': float(os.environ.get("PERFORMANCE_SLOW_REQUEST_MS", 1000)),
+    'SERVER_TIMING': bool(int(os.environ.get("PERFORMANCE_SERVER_TIMING", 1))),
+    'METRICS': bool(int(os.environ.get("PROMETHEUS_METRICS", 1))),
+}
+# /metrics answers 404 unless scrapers send this as a bearer token, it is open in DEBUG when unset.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Budgets of `manage.py profile_imports --check`: milliseconds of imports until each process type is ready,
+# and SDKs that are only imported on first use (`app.lazy.lazy_import`), never while a process boots.
+IMPORT_TIME_BUDGETS_MS = {
+    'web': int(os.environ.get("IMPORT_TIME_BUDGET_WEB_MS", 1500)),
+    'celery': int(os.environ.get("IMPORT_TIME_BUDGET_CELERY_MS", 1500)),
+    'manage': int(os.environ.get("IMPORT_TIME_BUDGET_MANAGE_MS", 1000)),
+}
+DEFERRED_IMPORTS = ['facebook_business', 'stripe', 'openai']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'app.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 FACEBOOK_APP_ID = os.environ.get("FACEBOOK_APP_ID")
 FACEBOOK_APP_SECRET = os.environ.get("FACEBOOK_APP_SECRET")
@@ -1,23 +1,25 @@
 from dj_rest_auth.views import PasswordResetConfirmView
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from app.metrics import metrics_view
+from app.schema import API_INFO, CachedSchemaGenerator, schema_view as openapi_schema_view
+
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Social Media Automation Platform API",
-        default_version='v1',
-        description="API for Social Media Automation Platform",
-    ),
+    API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
+    generator_class=CachedSchemaGenerator,
 )
 
 urlpatterns = [
+    # The UI page loads the schema from `openapi-schema`, see SWAGGER_SETTINGS['SPEC_URL'].
     path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('openapi.json', openapi_schema_view, name='openapi-schema'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 
     path('auth/password-reset/confirm/<uidb64>/<token>/', PasswordResetConfirmView.as_view(),
          name='password_reset_confirm'),
@@ -1,5 +1,8 @@
 from django.contrib import admin
 
-from workspace.models import Workspace
+from workspace.models import Workspace, TeamUsage, WorkspaceDeletion, TeamShard
 
 admin.site.register(Workspace)
+admin.site.register(TeamUsage)
+admin.site.register(WorkspaceDeletion)
+admin.site.register(TeamShard)
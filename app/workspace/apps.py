@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WorkspaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workspace'
+
+    def ready(self):
+        from workspace import signals
+        models = self.apps.get_models()
+        signals.connect_sharded_model_receivers(models)
+        signals.connect_social_media_account_receivers(models)
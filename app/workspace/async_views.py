@@ -0,0 +1,127 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from app.db_routers import is_sticky, use_primary, use_replica, use_shard
+from app.renderers import FastJSONRenderer
+from workspace.authentication import CachedTokenAuthentication
+from workspace.membership import MembershipCache
+from workspace.models import Workspace, WorkspaceRole
+from workspace.pagination import KeysetPagination
+from workspace.serializers import WorkspaceSerializer, WorkspaceExpandedListSerializer, WorkspaceMemberSerializer, \
+    WorkspaceSocialMediaAccountSerializer, WORKSPACE_LIST_VALUES, serialize_workspace_rows
+from workspace.services import WorkspaceService
+from workspace.sharding import ShardMap
+from workspace.views import get_cache_validators, patch_cache_validators
+
+
+class AsyncWorkspaceView(View):
+    """
+        Read-only workspace endpoints for ASGI servers, next to the sync `WorkspaceViewSet`.
+        A request waiting on the database yields the event loop instead of holding a worker thread.
+        Authentication, membership and shard lookups are mostly cache hits and run through `sync_to_async`,
+        the workspace reads use the async ORM.
+    """
+    http_method_names = ['get']
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+    def not_found(self):
+        return self.render({'detail': _("Workspace not found.")}, status.HTTP_404_NOT_FOUND)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Without DRF's exception handler API errors, an invalid cursor or a failed authentication, render here.
+        try:
+            return await self.authenticated_dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.render({'detail': exc.detail}, exc.status_code)
+
+    async def authenticated_dispatch(self, request, *args, **kwargs):
+        authenticated = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+        if not authenticated:
+            return self.render({'detail': exceptions.NotAuthenticated.default_detail}, status.HTTP_401_UNAUTHORIZED)
+
+        request.user, request.auth = authenticated
+        self.membership = await sync_to_async(MembershipCache.get)(request.user.id)
+        shard = await sync_to_async(ShardMap.get)(self.membership.team_id)
+        replica = not await sync_to_async(is_sticky)(request.user.id)
+        with use_shard(shard), (use_replica() if replica else use_primary()):
+            return await super(AsyncWorkspaceView, self).dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        workspaces = Workspace.objects.filter(is_pending_deletion=False)
+        if self.membership.is_owner:
+            return workspaces.filter(team_id=self.membership.team_id)
+        return workspaces.filter(pk__in=list(self.membership.workspace_ids))
+
+    async def get_not_modified_response(self):
+        self.cache_validators = await sync_to_async(get_cache_validators)(self.membership.team_id,
+                                                                           self.request.user.id)
+        etag, last_modified = self.cache_validators
+        if not etag:
+            return None
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        return patch_cache_validators(response, self.cache_validators) if response else None
+
+
+class AsyncWorkspaceListView(AsyncWorkspaceView):
+
+    async def get(self, request):
+        not_modified = await self.get_not_modified_response()
+        if not_modified:
+            return not_modified
+
+        paginator = KeysetPagination()
+        queryset = self.get_queryset().with_member_count()
+        if 'users' in request.GET.get('expand', '').split(','):
+            roles = Prefetch('roles', WorkspaceRole.objects.order_by('pk'))
+            page = await paginator.apaginate_queryset(queryset.prefetch_related(roles), Request(request))
+            results = WorkspaceExpandedListSerializer(page, many=True).data
+        else:
+            page = await paginator.apaginate_queryset(queryset.values(*WORKSPACE_LIST_VALUES), Request(request))
+            results = serialize_workspace_rows(page)
+        response = self.render({'next': paginator.get_next_link(), 'results': results})
+        return patch_cache_validators(response, self.cache_validators)
+
+
+class AsyncWorkspaceDetailView(AsyncWorkspaceView):
+
+    async def get(self, request, pk):
+        if not self.membership.can_access(pk):
+            return self.not_found()
+
+        not_modified = await self.get_not_modified_response()
+        if not_modified:
+            return not_modified
+
+        roles = Prefetch('roles', WorkspaceRole.objects.order_by('pk'))
+        try:
+            workspace = await self.get_queryset().prefetch_related(roles).aget(pk=pk)
+        except Workspace.DoesNotExist:
+            return self.not_found()
+        return patch_cache_validators(self.render(WorkspaceSerializer(workspace).data), self.cache_validators)
+
+
+class AsyncWorkspaceMembersView(AsyncWorkspaceView):
+
+    async def get(self, request, pk):
+        if not self.membership.can_access(pk):
+            return self.not_found()
+        users = await WorkspaceService.aget_users_in_workspace(pk)
+        return self.render({'count': len(users), 'results': WorkspaceMemberSerializer(users, many=True).data})
+
+
+class AsyncWorkspaceSocialMediaAccountsView(AsyncWorkspaceView):
+
+    async def get(self, request, pk):
+        if not self.membership.can_access(pk):
+            return self.not_found()
+        accounts = await WorkspaceService.aget_social_media_accounts_in_workspace(pk)
+        return self.render({'count': len(accounts),
+                            'results': WorkspaceSocialMediaAccountSerializer(accounts, many=True).data})
@@ -0,0 +1,60 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from workspace.cache import TwoTierCache
+
+token_cache = TwoTierCache('auth-token', timeout=getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
+
+def token_cache_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(*keys: str) -> None:
+    """
+        Drop the entries now and again after commit, an authentication meanwhile
+        reads the token, user and team from before the commit and would cache them.
+    """
+    def delete():
+        for key in keys:
+            token_cache.delete(token_cache_key(key))
+
+    delete()
+    transaction.on_commit(delete)
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    invalidate_tokens(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+        TokenAuthentication reading the token, its user and the user's `owned_team` from
+        `token_cache`, so authenticated requests skip the token + user join.
+        Entries are dropped by `workspace.signals` when the token, user or owned team changes.
+    """
+
+    def load_token(self, key):
+        token = Token.objects.select_related('user__owned_team').filter(key=key).first()
+        if token:
+            # Touch the reverse relation so a user without a team caches that too.
+            hasattr(token.user, 'owned_team')
+        return token
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(token_cache_key(key), lambda: self.load_token(key))
+        if not token:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        # Requests must not share the cached instances.
+        token = copy.deepcopy(token)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+
+def percentile(samples: list, q: float) -> float:
+    """ nearest-rank percentile of `samples`, q in (0, 100] """
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples: list) -> dict:
+    return {
+        'runs': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def time_call(run: Callable, setup: Optional[Callable] = None, repeat: int = 50, warmup: int = 3) -> dict:
+    """ time `run(*setup())` `repeat` times, `setup` is excluded from the measurement """
+    samples = []
+    for i in range(warmup + repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+
+def time_concurrent(request: Callable[[], Awaitable], concurrency: int, repeat: int = 20, warmup: int = 2) -> dict:
+    """
+        time bursts of `concurrency` simultaneous `request()` coroutines on one event loop, the way an
+        ASGI worker serves polling clients, `rps` is the throughput over all measured bursts
+    """
+    async def burst():
+        await asyncio.gather(*(request() for x in range(concurrency)))
+
+    samples = []
+    for i in range(warmup + repeat):
+        started = time.perf_counter()
+        async_to_sync(burst)()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return dict(summarize(samples), concurrency=concurrency, rps=round(concurrency * repeat / sum(samples), 1))
+
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class ImportTiming(NamedTuple):
+    self_us: int
+    cumulative_us: int
+    # module whose import triggered this one, None for the imports of the profiled code itself
+    importer: Optional[str]
+
+
+def parse_importtime(output: str) -> Dict[str, ImportTiming]:
+    """ timings of `python -X importtime` output by module, nested imports are printed before their importer """
+    timings, waiting = {}, []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        depth = len(indent) // 2
+        while waiting and waiting[-1][0] > depth:
+            child_depth, child, child_self, child_cumulative = waiting.pop()
+            timings[child] = ImportTiming(child_self, child_cumulative, module)
+        waiting.append((depth, module, int(self_us), int(cumulative_us)))
+    for depth, module, self_us, cumulative_us in waiting:
+        timings[module] = ImportTiming(self_us, cumulative_us, None)
+    return timings
+
+
+def profile_imports(code: str) -> Dict[str, ImportTiming]:
+    """ import timings of running `code` in a fresh interpreter from the project directory """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else code)
+    return parse_importtime(result.stderr)
+
+
+def import_chain(timings: Dict[str, ImportTiming], module: str) -> List[str]:
+    """ `module`, the module that imported it, the one that imported that, up to the profiled code """
+    chain = [module]
+    while timings[chain[-1]].importer and len(chain) < len(timings):
+        chain.append(timings[chain[-1]].importer)
+    return chain
+
+
+def heaviest_packages(timings: Dict[str, ImportTiming], top: int = 10) -> List[tuple]:
+    """ (top-level package, milliseconds) of the packages whose own modules took longest to import """
+    totals = Counter()
+    for module, timing in timings.items():
+        totals[module.split('.')[0]] += timing.self_us
+    return [(package, round(us / 1000, 1)) for package, us in totals.most_common(top)]
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return os.environ.get('CI_COMMIT_SHA')
+
+
+def write_report(path: str, results: Dict[str, dict], dataset: dict) -> dict:
+    report = {
+        'commit': current_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'dataset': dataset,
+        'results': results,
+    }
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    return report
+
+
+def compare_reports(base: dict, head: dict, metric: str = 'p95_ms', threshold: float = 1.2) -> list:
+    """ rows of (name, base, head, ratio, regressed) for every benchmark present in both reports """
+    rows = []
+    for name, head_result in sorted(head['results'].items()):
+        base_result = base['results'].get(name)
+        if not base_result:
+            continue
+        ratio = head_result[metric] / base_result[metric] if base_result[metric] else math.inf
+        rows.append((name, base_result[metric], head_result[metric], ratio, ratio > threshold))
+    return rows
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from django.core.cache import cache
+
+from app.db_routers import use_primary
+from app.instrumentation import record_cache_access
+
+MISSING = object()
+
+
+class LocalLRU:
+    """ thread-safe in-process LRU with a per-entry expiry """
+
+    def __init__(self, maxsize: int = 1024, timeout: float = 5):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache:
+    """
+        Local LRU in front of the shared (Redis) cache.
+        `delete` drops both tiers of the current process, other processes drop their
+        local copy once `local_timeout` expires, so keep it short.
+    """
+    registry = []
+
+    def __init__(self, prefix: str, timeout: int, local_timeout: float = 5, maxsize: int = 1024):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.local = LocalLRU(maxsize=maxsize, timeout=local_timeout)
+        TwoTierCache.registry.append(self)
+
+    def make_key(self, key: Hashable) -> str:
+        return f'{self.prefix}:{key}'
+
+    def get(self, key: Hashable, loader: Optional[Callable[[], Any]] = None) -> Any:
+        value = self.local.get(key)
+        if value is not MISSING:
+            record_cache_access(hit=True)
+            return value
+        value = cache.get(self.make_key(key), MISSING)
+        record_cache_access(hit=value is not MISSING)
+        if value is MISSING:
+            if loader is None:
+                return None
+            # Cached values outlive any replica lag, so they are always loaded from the primary.
+            with use_primary():
+                value = loader()
+            cache.set(self.make_key(key), value, self.timeout)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        cache.set(self.make_key(key), value, self.timeout)
+        self.local.set(key, value)
+
+    def delete(self, key: Hashable) -> None:
+        cache.delete(self.make_key(key))
+        self.local.delete(key)
+
+    @classmethod
+    def clear_local(cls) -> None:
+        for instance in cls.registry:
+            instance.local.clear()
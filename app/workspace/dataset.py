@@ -0,0 +1,83 @@
+import uuid
+from typing import List
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import router, transaction
+
+from core.models import Team
+from social_media.models import InstagramAccount
+from subscription.models import StripeUser
+from workspace.models import Workspace, WorkspaceRole, Role, TeamUsage, Entitlement
+
+User = get_user_model()
+
+
+def bulk_save(model, objs: list, batch_size: int) -> list:
+    """
+        `bulk_create`, which refuses multi-table inherited models. Those get their parent rows bulk inserted
+        first, then the rows of their own table keyed by the parents' primary keys. No signal is sent.
+    """
+    if not model._meta.parents:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    for parent, link in model._meta.parents.items():
+        parent_fields = parent._meta.concrete_fields
+        parent_objs = bulk_save(parent, [
+            parent(**{field.attname: getattr(obj, field.attname) for field in parent_fields}) for obj in objs
+        ], batch_size)
+        for obj, parent_obj in zip(objs, parent_objs):
+            for field in parent_fields:
+                setattr(obj, field.attname, getattr(parent_obj, field.attname))
+            setattr(obj, link.attname, parent_obj.pk)
+
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=model._meta.local_concrete_fields)
+    using = router.db_for_write(model)
+    for obj in objs:
+        obj._state.adding, obj._state.db = False, using
+    return objs
+
+
+def build_tenant(workspaces: int = 50, members: int = 500, socials: int = 2000, roles_per_member: int = 1,
+                 limit: int = 100000, prefix: str = 'synthetic', batch_size: int = 1000) -> Team:
+    """
+        Build one synthetic team with bulk inserts. Members get `roles_per_member` roles spread
+        over the workspaces and social accounts are dealt round-robin. Signals are skipped, so
+        the `TeamUsage` and `Entitlement` rows are written directly with the known counts.
+    """
+    token = uuid.uuid4().hex[:12]
+    workspaces, roles_per_member = max(workspaces, 1), min(roles_per_member, max(workspaces, 1))
+    with transaction.atomic():
+        owner = User.objects.create_user(email=f'{prefix}.{token}.owner@example.com', password=None)
+        stripe_user = StripeUser.objects.create(user=owner, customer_id=f'{prefix}_{token}')
+        Entitlement.objects.update_or_create(stripe_user=stripe_user, defaults={
+            'max_workspaces': limit, 'max_users': limit, 'max_socials': limit,
+        })
+        team = Team.objects.create(name=f'{prefix} {token}', owner=owner)
+
+        workspace_objs = bulk_save(Workspace, [
+            Workspace(name=f'{prefix} workspace {w}', team=team) for w in range(workspaces)
+        ], batch_size)
+        password = make_password(None)
+        users = bulk_save(User, [
+            User(email=f'{prefix}.{token}.{m}@example.com', password=password) for m in range(members)
+        ], batch_size)
+        bulk_save(WorkspaceRole, [
+            WorkspaceRole(workspace=workspace_objs[(m + k) % workspaces], user=user, role=Role.SOCIAL_MEDIA_MANAGER)
+            for m, user in enumerate(users)
+            for k in range(roles_per_member)
+        ], batch_size)
+        bulk_save(InstagramAccount, [
+            InstagramAccount(username=f'{prefix}_{token}_{s}', access_token=f'{prefix}_{token}_{s}',
+                             workspace=workspace_objs[s % workspaces])
+            for s in range(socials)
+        ], batch_size)
+        TeamUsage.objects.update_or_create(team=team, defaults={
+            'workspace_count': workspaces, 'distinct_member_count': members, 'social_account_count': socials,
+        })
+    return team
+
+
+def build_tenants(teams: int = 1, **kwargs) -> List[Team]:
+    return [build_tenant(**kwargs) for x in range(teams)]
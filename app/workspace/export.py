@@ -0,0 +1,75 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterator
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+
+from social_media.models import SocialMediaAccount
+from workspace.models import WorkspaceRole
+
+User = get_user_model()
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ('type', 'id', 'email', 'first_name', 'last_name', 'role', 'joined_at', 'username', 'platform')
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """ file-like object for `csv.writer` that hands every row back instead of buffering it """
+
+    def write(self, value):
+        return value
+
+
+def iter_workspace_records(workspace_id: int, using: str = DEFAULT_DB_ALIAS,
+                           chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+        Members of the workspace with their roles, then its social media accounts, read from the `using` shard.
+        Both are read as tuples through `iterator`, which uses server-side cursors where the database has them.
+        Users live on `default`, so they are fetched once per chunk of roles instead of joined.
+    """
+    roles = WorkspaceRole.objects.using(using).filter(workspace_id=workspace_id).order_by('pk') \
+        .values_list('user_id', 'role', 'created_at').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(roles, chunk_size))
+        if not chunk:
+            break
+        users = User.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=[user_id for user_id, x, y in chunk]) \
+            .values('pk', 'email', 'first_name', 'last_name')
+        users = {user['pk']: user for user in users}
+        for user_id, role, joined_at in chunk:
+            user = users.get(user_id, {})
+            yield {'type': 'member', 'id': user_id, 'email': user.get('email'), 'first_name': user.get('first_name'),
+                   'last_name': user.get('last_name'), 'role': role, 'joined_at': joined_at}
+
+    accounts = SocialMediaAccount.objects.using(using).filter(workspace_id=workspace_id).order_by('pk') \
+        .values_list('pk', 'username', 'platform')
+    for account_id, username, platform in accounts.iterator(chunk_size=chunk_size):
+        yield {'type': 'social_media_account', 'id': account_id, 'username': username, 'platform': platform}
+
+
+def stream_csv(records: Iterator[dict]) -> Iterator[str]:
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_COLUMNS, restval='')
+    yield writer.writeheader()
+    for record in records:
+        if record.get('joined_at'):
+            record['joined_at'] = record['joined_at'].isoformat()
+        yield writer.writerow(record)
+
+
+def stream_ndjson(records: Iterator[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_workspace_export(workspace_id: int, export_format: str, using: str = DEFAULT_DB_ALIAS) -> Iterator[str]:
+    records = iter_workspace_records(workspace_id, using)
+    if export_format == 'ndjson':
+        return stream_ndjson(records)
+    return stream_csv(records)
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import time
+from functools import wraps
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# How often a duplicate request looks for the response of the request it waits for.
+POLL_INTERVAL = 0.05
+
+
+def idempotency_cache_keys(user_id: int, key: str) -> Tuple[str, str]:
+    """ cache keys of the stored response and of the in-flight lock, keys are scoped by user """
+    digest = hashlib.sha256(f'{user_id}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}', f'idempotency-lock:{digest}'
+
+
+def request_fingerprint(request) -> str:
+    """ a key may only be repeated with the same request, the parsed data counts and not its key order or spacing """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256('\n'.join([request.method, request.path, body]).encode()).hexdigest()
+
+
+def replay(stored: dict) -> Response:
+    response = Response(stored['data'], status=stored['status'], headers=stored['headers'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def run_once(request, key: str, handler) -> Response:
+    """
+        Run `handler` for the first request with `key` and store its response for `IDEMPOTENCY_TTL` seconds,
+        repeats get the stored response. A duplicate arriving while the first one runs waits for its response
+        up to `IDEMPOTENCY_WAIT_SECONDS`. Server errors are not stored, the request can be retried.
+    """
+    response_key, lock_key = idempotency_cache_keys(request.user.id, key)
+    fingerprint = request_fingerprint(request)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        stored: Optional[dict] = cache.get(response_key)
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                return Response({'detail': _("Idempotency-Key was already used for a different request.")},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return replay(stored)
+        if cache.add(lock_key, fingerprint, settings.IDEMPOTENCY_LOCK_SECONDS):
+            break
+        if time.monotonic() >= deadline:
+            return Response({'detail': _("A request with this Idempotency-Key is still being processed.")},
+                            status=status.HTTP_409_CONFLICT)
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        response = handler()
+        if response.status_code < 500 and not getattr(response, 'streaming', False):
+            cache.set(response_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+                'headers': dict(response.items()),
+            }, settings.IDEMPOTENCY_TTL)
+        return response
+    finally:
+        cache.delete(lock_key)
+
+
+def idempotent(handler):
+    """ `run_once` for view handlers called with an `Idempotency-Key` header, without it they run as before """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': _("Idempotency-Key must be 1 to 255 characters long.")},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return run_once(request, key, lambda: handler(self, request, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Team
+from workspace.benchmarks import summarize, write_report
+
+# Environment of every compared gunicorn setup, on top of `app.gunicorn_config`'s defaults.
+MODES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'sync-no-preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': '0'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'asgi': {'GUNICORN_WORKER_CLASS': 'asgi'},
+}
+
+
+def proportional_memory_mb(pid: int) -> Optional[float]:
+    """ PSS of a process, its shared pages are split between the processes sharing them """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                # The command name may contain spaces, the parent pid is the second field after it.
+                if int(stat.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+class Command(BaseCommand):
+    help = "Start gunicorn in every worker mode, measure startup, throughput and memory on the workspace endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the JSON report, comparable with compare_benchmarks.")
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--team', type=int, help="Team whose owner polls, the first team by default.")
+        parser.add_argument('--workers', type=int, help="Fixed WEB_CONCURRENCY, autotuned by default.")
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent polling clients.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of load per endpoint.")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--startup-timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        team = Team.objects.filter(**({'pk': options['team']} if options['team'] else {})).order_by('pk').first()
+        workspace = team.workspaces.order_by('pk').first() if team else None
+        if not workspace:
+            raise CommandError("No team with a workspace to poll, run generate_tenants first.")
+        token = Token.objects.get_or_create(user_id=team.owner_id)[0].key
+
+        base_url = f"http://127.0.0.1:{options['port']}"
+        endpoints = {
+            'list': reverse('workspace:workspace-list'),
+            'retrieve': reverse('workspace:workspace-detail', kwargs={'pk': workspace.pk}),
+            'async_list': reverse('workspace:async-workspace-list'),
+        }
+        results = {}
+        for mode in options['modes']:
+            env = dict(os.environ, PORT=str(options['port']), **MODES[mode])
+            if options['workers']:
+                env['WEB_CONCURRENCY'] = str(options['workers'])
+            started = time.perf_counter()
+            server = subprocess.Popen(['gunicorn', '-c', 'python:app.gunicorn_config'], cwd=settings.BASE_DIR,
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.wait_until_ready(server, base_url + endpoints['list'], token, options['startup_timeout'])
+                results[f'server.{mode}.startup'] = summarize([time.perf_counter() - started])
+                for name, path in endpoints.items():
+                    results[f'server.{mode}.{name}'] = self.load(base_url + path, token, options['clients'],
+                                                                 options['duration'])
+                memory = [proportional_memory_mb(pid) for pid in [server.pid, *child_pids(server.pid)]]
+                results[f'server.{mode}.startup']['pss_mb'] = round(sum(filter(None, memory)), 1)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+            self.stdout.write(f"{mode}: " + ', '.join(
+                f"{name} {results[f'server.{mode}.{name}']['rps']} rps" for name in endpoints))
+
+        write_report(options['output'], results, {'clients': options['clients'], 'duration': options['duration'],
+                                                   'workspaces': team.workspaces.count()})
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
+
+    def wait_until_ready(self, server, url, token, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with {server.returncode} before serving requests.")
+            try:
+                if requests.get(url, headers={'Authorization': f'Token {token}'}, timeout=5).ok:
+                    return
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.1)
+        raise CommandError(f"gunicorn did not serve {url} within {timeout} seconds.")
+
+    def load(self, url, token, clients, duration):
+        """ `clients` threads polling `url` back to back for `duration` seconds """
+        deadline = time.monotonic() + duration
+
+        def poll():
+            samples, errors = [], 0
+            with requests.Session() as session:
+                session.headers['Authorization'] = f'Token {token}'
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        ok = session.get(url, timeout=30).ok
+                    except requests.RequestException:
+                        ok = False
+                    samples.append(time.perf_counter() - started)
+                    errors += not ok
+            return samples, errors
+
+        with ThreadPoolExecutor(clients) as pool:
+            polled = list(pool.map(lambda x: poll(), range(clients)))
+        samples = [sample for client_samples, x in polled for sample in client_samples]
+        return dict(summarize(samples), rps=round(len(samples) / duration, 1),
+                    errors=sum(errors for x, errors in polled))
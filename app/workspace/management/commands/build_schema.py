@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.schema import write_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema once, for the swagger UI to serve without introspecting the API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_PATH,
+                            help="Path of the JSON schema, OPENAPI_SCHEMA_PATH by default.")
+
+    def handle(self, *args, **options):
+        schema = write_schema(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(schema.content)} bytes to {options['output']}, ETag {schema.etag}."))
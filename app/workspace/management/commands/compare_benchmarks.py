@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.benchmarks import compare_reports
+
+
+class Command(BaseCommand):
+    help = "Compare two workspace benchmark reports and fail when the head report regressed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('base', help="Report of the base commit.")
+        parser.add_argument('head', help="Report of the commit under test.")
+        parser.add_argument('--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms'])
+        parser.add_argument('--threshold', type=float, default=1.2, help="Allowed head/base ratio.")
+
+    def handle(self, *args, **options):
+        reports = []
+        for path in (options['base'], options['head']):
+            with open(path) as report_file:
+                reports.append(json.load(report_file))
+
+        rows = compare_reports(*reports, metric=options['metric'], threshold=options['threshold'])
+        for name, base, head, ratio, regressed in rows:
+            line = f"{name:<60} {base:>10.3f} {head:>10.3f} {ratio:>6.2f}x"
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} benchmarks."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from workspace.dataset import build_tenant
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic large tenants with bulk inserts, for benchmarks and load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=1)
+        parser.add_argument('--workspaces', type=int, default=50, help="Workspaces per team.")
+        parser.add_argument('--members', type=int, default=500, help="Members per team.")
+        parser.add_argument('--socials', type=int, default=2000, help="Social media accounts per team.")
+        parser.add_argument('--roles-per-member', type=int, default=1)
+        parser.add_argument('--prefix', default='synthetic', help="Prefix of generated names and emails.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        for i in range(options['teams']):
+            team = build_tenant(
+                workspaces=options['workspaces'],
+                members=options['members'],
+                socials=options['socials'],
+                roles_per_member=options['roles_per_member'],
+                prefix=options['prefix'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(f"Team {team.id} created ({i + 1}/{options['teams']}).")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['teams']} teams in {time.perf_counter() - started:.1f}s."
+        ))
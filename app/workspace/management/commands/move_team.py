@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.sharding import ShardMoveError, move_team
+
+
+class Command(BaseCommand):
+    help = "Move the workspaces, roles and social media accounts of a team to another shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_id', type=int)
+        parser.add_argument('shard', help="Target database alias, one of TENANT_SHARDS.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--settle', type=float, default=2,
+                            help="Seconds to wait for in-flight writes once the team is frozen.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            move_team(options['team_id'], options['shard'], batch_size=options['batch_size'],
+                      settle=options['settle'], log=self.stdout.write)
+        except ShardMoveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Team {options['team_id']} moved to {options['shard']} in {time.perf_counter() - started:.1f}s."
+        ))
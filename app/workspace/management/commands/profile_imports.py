@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.benchmarks import heaviest_packages, import_chain, profile_imports, summarize, write_report
+
+# What each process type imports before it serves its first request, task or command.
+PROCESSES = {
+    'web': "from app.wsgi import application; from django.urls import get_resolver; get_resolver().url_patterns",
+    'celery': "from app.celery import app; import django; django.setup(); app.loader.import_default_modules()",
+    'manage': "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings'); import django; "
+              "django.setup(); from django.core.management import get_commands; get_commands()",
+}
+
+
+class Command(BaseCommand):
+    help = "Profile the imports of every process type in a fresh interpreter and report the heaviest packages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--process', nargs='+', choices=list(PROCESSES), default=list(PROCESSES))
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per process, the fastest one is reported.")
+        parser.add_argument('--top', type=int, default=10, help="Packages listed per process.")
+        parser.add_argument('--output', help="Write the timings as a report comparable with compare_benchmarks.")
+        parser.add_argument('--check', action='store_true',
+                            help="Fail when a process exceeds IMPORT_TIME_BUDGETS_MS or imports DEFERRED_IMPORTS.")
+
+    def handle(self, *args, **options):
+        results, violations = {}, []
+        for process in options['process']:
+            runs = []
+            for x in range(max(options['repeat'], 1)):
+                try:
+                    runs.append(profile_imports(PROCESSES[process]))
+                except RuntimeError as exc:
+                    raise CommandError(f"Importing the {process} process failed: {exc}")
+            totals = [sum(timing.self_us for timing in timings.values()) / 10 ** 6 for timings in runs]
+            timings = runs[totals.index(min(totals))]
+            total_ms = round(min(totals) * 1000, 1)
+            results[f'imports.{process}'] = dict(summarize(totals), modules=len(timings))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{process}: {total_ms} ms, {len(timings)} modules"))
+            for package, package_ms in heaviest_packages(timings, options['top']):
+                self.stdout.write(f"  {package:<40} {package_ms:>10.1f} ms")
+
+            budget = settings.IMPORT_TIME_BUDGETS_MS.get(process)
+            if budget and total_ms > budget:
+                violations.append(f"{process} imports take {total_ms} ms, over the budget of {budget} ms")
+            for module in settings.DEFERRED_IMPORTS:
+                if module in timings:
+                    chain = ' <- '.join(import_chain(timings, module))
+                    violations.append(f"{process} imports {module} at boot: {chain}")
+
+        if options['output']:
+            write_report(options['output'], results, {'processes': options['process'], 'repeat': options['repeat']})
+        if options['check'] and violations:
+            raise CommandError('\n'.join(violations))
+        for violation in violations:
+            self.stdout.write(self.style.WARNING(violation))
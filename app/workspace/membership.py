@@ -0,0 +1,78 @@
+from typing import Dict, NamedTuple, Optional
+
+from core.models import Team
+from workspace.cache import TwoTierCache
+from workspace.models import Workspace, WorkspaceRole
+from workspace.sharding import each_shard, on_commit, use_team_shard
+
+membership_cache = TwoTierCache('membership', timeout=60 * 60)
+
+
+class Membership(NamedTuple):
+    team_id: Optional[int]
+    is_owner: bool
+    # workspace id -> role of the user, None for the workspaces of an owned team
+    roles: Dict[int, Optional[str]]
+
+    @property
+    def workspace_ids(self):
+        return self.roles.keys()
+
+    def can_access(self, workspace_id) -> bool:
+        try:
+            return int(workspace_id) in self.roles
+        except (TypeError, ValueError):
+            return False
+
+    def role(self, workspace_id) -> Optional[str]:
+        return self.roles.get(int(workspace_id))
+
+
+class MembershipCache:
+    """
+        Accessible workspaces of a user and the user's role in each of them, in the two-tier cache.
+        Entries are dropped by `workspace.signals` on `Workspace`, `WorkspaceRole` and `Team` writes.
+    """
+
+    @staticmethod
+    def get(user_id: int) -> Membership:
+        return membership_cache.get(user_id, lambda: MembershipCache.load(user_id))
+
+    @staticmethod
+    def load(user_id: int) -> Membership:
+        team_id = Team.objects.filter(owner_id=user_id).values_list('id', flat=True).first()
+        if team_id:
+            with use_team_shard(team_id):
+                workspace_ids = list(Workspace.objects.filter(team_id=team_id, is_pending_deletion=False)
+                                     .values_list('id', flat=True))
+            return Membership(team_id=team_id, is_owner=True, roles=dict.fromkeys(workspace_ids))
+
+        # Workspaces pending deletion are already gone as far as the API is concerned.
+        # The team of a member is not known up front, so every shard is asked.
+        roles = []
+        for alias in each_shard():
+            roles += WorkspaceRole.objects.filter(user_id=user_id, workspace__is_pending_deletion=False) \
+                .values_list('workspace_id', 'role', 'workspace__team_id')
+        if not roles:
+            return Membership(team_id=None, is_owner=False, roles={})
+        return Membership(team_id=roles[0][2], is_owner=False,
+                          roles={workspace_id: role for workspace_id, role, x in roles})
+
+    @staticmethod
+    def invalidate(*user_ids: int) -> None:
+        """
+            Drop the entries now and again after commit, a request loading them meanwhile
+            reads the rows from before the commit and would cache them for an hour.
+        """
+        user_ids = [user_id for user_id in user_ids if user_id]
+
+        def delete():
+            for user_id in user_ids:
+                membership_cache.delete(user_id)
+
+        delete()
+        on_commit(delete)
+
+    @staticmethod
+    def invalidate_team_owner(team_id: int) -> None:
+        MembershipCache.invalidate(Team.objects.filter(pk=team_id).values_list('owner_id', flat=True).first())
@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from simple_history.models import HistoricalRecords
+
+from app.db_routers import use_shard
 
 
 class Role(models.TextChoices):
@@ -10,23 +17,89 @@ class Role(models.TextChoices):
     ANALYST = 'ANALYST', _('Analyst')
 
 
+class DeletionStatus(models.TextChoices):
+    PENDING = 'PENDING', _('Pending')
+    RUNNING = 'RUNNING', _('Running')
+    DONE = 'DONE', _('Done')
+    FAILED = 'FAILED', _('Failed')
+
+
+class WorkspaceQuerySet(models.QuerySet):
+
+    def with_member_count(self):
+        # A correlated subquery, counting over the `users` join would reuse any membership filter.
+        member_count = WorkspaceRole.objects.filter(workspace=OuterRef('pk')).order_by() \
+            .values('workspace').annotate(count=Count('id')).values('count')
+        return self.annotate(member_count=Coalesce(Subquery(member_count), Value(0)))
+
+
+class WorkspaceManager(models.Manager.from_queryset(WorkspaceQuerySet)):
+
+    def supports_update_returning(self, using: str) -> bool:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            return True
+        return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+    def update_name(self, pk, name: str):
+        """ rename a workspace with a single UPDATE ... RETURNING, returns None when it does not exist """
+        # `self.db` and `raw()` route as reads, which may be a replica, the write and its result use the primary.
+        using = self._db or router.db_for_write(self.model)
+        now = timezone.now()
+        if not self.supports_update_returning(using):
+            if not self.using(using).filter(pk=pk).update(name=name, updated_at=now):
+                return None
+            return self.using(using).get(pk=pk)
+
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        columns = ', '.join(qn(field.column) for field in opts.concrete_fields)
+        sql = (f'UPDATE {qn(opts.db_table)} SET {qn("name")} = %s, {qn("updated_at")} = %s '
+               f'WHERE {qn(opts.pk.column)} = %s RETURNING {columns}')
+        params = [name, connection.ops.adapt_datetimefield_value(now), opts.pk.get_prep_value(pk)]
+        return next(iter(self.db_manager(using).raw(sql, params)), None)
+
+
 class Workspace(models.Model):
     name = models.CharField(max_length=255)
     users = models.ManyToManyField("core.User", through='WorkspaceRole', related_name='associated_workspaces')
-    team = models.ForeignKey("core.Team", on_delete=models.CASCADE, related_name='workspaces')
+    # Workspaces can live on another shard than their team, see `workspace.sharding`.
+    team = models.ForeignKey("core.Team", on_delete=models.CASCADE, related_name='workspaces', db_constraint=False)
     is_default = models.BooleanField(default=False, editable=False)  # Workspace that is created on registration.
+    # Hidden from the API while the `delete_workspace` task removes it in batches.
+    is_pending_deletion = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WorkspaceManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['team', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Workspace, cls).from_db(db, field_names, values)
+        # Deferred loads leave `team_id` out, `save` then falls back to reading it from the database.
+        if 'team_id' in instance.__dict__:
+            instance._loaded_team_id = instance.team_id
+        return instance
+
     def save(self, *args, **kwargs):
         if self.pk:
-            original = Workspace.objects.get(pk=self.pk)
-            if original.team != self.team:
+            if hasattr(self, '_loaded_team_id'):
+                original_team_id = self._loaded_team_id
+            else:
+                original_team_id = Workspace.objects.filter(pk=self.pk).values_list('team_id', flat=True).first()
+            if original_team_id is not None and original_team_id != self.team_id:
                 raise ValidationError(_("Changing the owner of a workspace is not allowed."))
         super(Workspace, self).save(*args, **kwargs)
+        self._loaded_team_id = self.team_id
 
 
 class WorkspaceRole(models.Model):
@@ -38,24 +111,99 @@ class WorkspaceRole(models.Model):
         help_text=_("User role in a workspace"),
     )
     workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name='roles')
-    user = models.ForeignKey("core.User", on_delete=models.CASCADE, related_name='roles')
+    user = models.ForeignKey("core.User", on_delete=models.CASCADE, related_name='roles', db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    history = HistoricalRecords(user_db_constraint=False)
 
     class Meta:
         unique_together = ('workspace', 'user')
+        indexes = [
+            models.Index(fields=['user', 'workspace']),
+        ]
 
     def __str__(self):
         return f'{self.user.email} - {self.role} - {self.workspace.name}'
 
     def save(self, *args, **kwargs):
+        # Teams live on `default` and workspaces on the team's shard, so the two are read separately.
+        team_id = Workspace.objects.filter(pk=self.workspace_id).values_list('team_id', flat=True).get()
+        team_model = Workspace.team.field.related_model
+        owner_id = team_model.objects.filter(pk=team_id).values_list('owner_id', flat=True).first()
+
         # Check if the user is the owner of the current team
-        if hasattr(self.user, "owned_team") and self.user.owned_team == self.workspace.team:
+        if owner_id == self.user_id:
             raise ValidationError(_("The user is the owner of this team and cannot be in another team's workspace."))
 
-        # Check if the user is already in another team's workspace
-        for workspace_role in self.user.roles.all():
-            if workspace_role.workspace.team != self.workspace.team:
-                raise ValidationError(_("The user is already in another team's workspace and cannot be added."))
+        # Check if the user is already in another team's workspace, on any shard
+        for alias in settings.TENANT_SHARDS:
+            with use_shard(alias):
+                if WorkspaceRole.objects.filter(user_id=self.user_id).exclude(workspace__team_id=team_id).exists():
+                    raise ValidationError(_("The user is already in another team's workspace and cannot be added."))
 
         super(WorkspaceRole, self).save(*args, **kwargs)
+
+
+class TeamShard(models.Model):
+    """
+        Shard map entry, the database alias holding the workspaces of a team.
+        Teams without an entry live on `default`, entries are written by the `move_team` command.
+    """
+    team = models.OneToOneField("core.Team", on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.team_id} - {self.alias}'
+
+
+class WorkspaceDeletion(models.Model):
+    """
+        Progress of a workspace removed in the background by the `delete_workspace` task.
+        Only the id of the workspace is kept, so the row outlives the workspace itself.
+    """
+    team = models.ForeignKey("core.Team", on_delete=models.CASCADE, related_name='workspace_deletions')
+    workspace_id = models.BigIntegerField(db_index=True)
+    status = models.CharField(max_length=10, choices=DeletionStatus.choices, default=DeletionStatus.PENDING)
+    # Roles and social media accounts of the workspace, plus the workspace row.
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.workspace_id} - {self.status} - {self.deleted}/{self.total}'
+
+
+class TeamUsage(models.Model):
+    """
+        Denormalized usage counters of a team, kept up to date by `workspace.signals`
+        and repaired by the `reconcile_team_usage` task.
+    """
+    team = models.OneToOneField("core.Team", on_delete=models.CASCADE, related_name='usage')
+    workspace_count = models.PositiveIntegerField(default=0)
+    distinct_member_count = models.PositiveIntegerField(default=0)
+    social_account_count = models.PositiveIntegerField(default=0)
+    # Bumped on every workspace, membership or account change of the team, used as a cache validator.
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.team_id} - {self.workspace_count}/{self.distinct_member_count}/{self.social_account_count}'
+
+
+class Entitlement(models.Model):
+    """
+        Limits of a StripeUser materialized from its subscription features,
+        rebuilt by `workspace.signals` whenever the subscription data changes.
+    """
+    stripe_user = models.OneToOneField("subscription.StripeUser", on_delete=models.CASCADE,
+                                       related_name='entitlement')
+    max_workspaces = models.PositiveIntegerField(default=0)
+    max_users = models.PositiveIntegerField(default=0)
+    max_socials = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.stripe_user_id} - {self.max_workspaces}/{self.max_users}/{self.max_socials}'
@@ -0,0 +1,17 @@
+from rest_framework.permissions import BasePermission
+
+from workspace.membership import MembershipCache
+
+
+class IsWorkspaceTeamOwner(BasePermission):
+    """
+        The user owns a team and, for object checks, the workspace belongs to it.
+        Reads the cached membership instead of resolving the team again.
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated
+                    and MembershipCache.get(request.user.id).is_owner)
+
+    def has_object_permission(self, request, view, obj):
+        return obj.team_id == MembershipCache.get(request.user.id).team_id
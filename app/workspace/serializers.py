@@ -1,9 +1,79 @@
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-from workspace.models import Workspace
+from social_media.models import SocialMediaAccount
+from workspace.models import Workspace, WorkspaceDeletion
+
+User = get_user_model()
+
+
+def role_user_ids(workspace):
+    """ ids of the workspace members, read from `roles` which live on the same shard as the workspace """
+    return [role.user_id for role in workspace.roles.all()]
 
 
 class WorkspaceSerializer(serializers.ModelSerializer):
+    users = serializers.SerializerMethodField()
+
     class Meta:
         model = Workspace
         fields = ["name", "users", "team", "is_default", "created_at", "updated_at"]
+
+    def get_users(self, workspace):
+        return role_user_ids(workspace)
+
+
+class WorkspaceListSerializer(serializers.ModelSerializer):
+    """ list representation, `member_count` comes from a queryset annotation """
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Workspace
+        fields = ["name", "team", "is_default", "member_count", "created_at", "updated_at"]
+
+
+# Columns read by `serialize_workspace_rows`, `pk` is only used by the pagination cursor.
+WORKSPACE_LIST_VALUES = ('pk', 'name', 'team', 'is_default', 'member_count', 'created_at', 'updated_at')
+_datetime_field = serializers.DateTimeField()
+
+
+def serialize_workspace_rows(rows):
+    """ `WorkspaceListSerializer` output for `.values(*WORKSPACE_LIST_VALUES)` rows, without field instances """
+    to_datetime = _datetime_field.to_representation
+    return [{
+        'name': row['name'],
+        'team': row['team'],
+        'is_default': row['is_default'],
+        'member_count': row['member_count'],
+        'created_at': to_datetime(row['created_at']),
+        'updated_at': to_datetime(row['updated_at']),
+    } for row in rows]
+
+
+class WorkspaceExpandedListSerializer(WorkspaceListSerializer):
+    """ list representation for `?expand=users`, expects `roles` to be prefetched """
+    users = serializers.SerializerMethodField()
+
+    class Meta(WorkspaceListSerializer.Meta):
+        fields = WorkspaceListSerializer.Meta.fields + ["users"]
+
+    def get_users(self, workspace):
+        return role_user_ids(workspace)
+
+
+class WorkspaceDeletionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkspaceDeletion
+        fields = ["id", "workspace_id", "status", "total", "deleted", "error", "created_at", "updated_at"]
+
+
+class WorkspaceMemberSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id", "email", "first_name", "last_name"]
+
+
+class WorkspaceSocialMediaAccountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SocialMediaAccount
+        fields = ["id", "username", "platform"]
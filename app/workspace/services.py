@@ -1,27 +1,207 @@
-from typing import Tuple, Optional, List
+from datetime import datetime
+from typing import Tuple, Optional, List, Iterable, NamedTuple
 
 from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from simple_history.models import HistoricalRecords
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
+from app.db_routers import get_shard, use_replica
+from app.metrics import record_quota_check
 from core.models import Team
-from workspace.models import Workspace, WorkspaceRole, Role
-from social_media.models import SocialMediaAccount, InstagramAccount
+from social_media.models import SocialMediaAccount
+from subscription.models import StripeUser
+from workspace import sharding
+from workspace.cache import TwoTierCache
+from workspace.membership import MembershipCache
+from workspace.models import Workspace, WorkspaceRole, Role, TeamUsage, Entitlement, WorkspaceDeletion, DeletionStatus
 
 User = get_user_model()
 
+USAGE_FIELDS = ('workspace_count', 'distinct_member_count', 'social_account_count')
+MAX_BULK_SIZE = 500
+DELETION_BATCH_SIZE = MAX_BULK_SIZE
 
+entitlement_cache = TwoTierCache('entitlement', timeout=60 * 60)
+
+
+def get_history_user() -> Optional[User]:
+    """ user of the current request, as stored by `HistoryRequestMiddleware` """
+    request = getattr(HistoricalRecords.context, 'request', None)
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+class Limits(NamedTuple):
+    max_workspaces: int = 0
+    max_users: int = 0
+    max_socials: int = 0
+
+
+class EntitlementService:
+
+    @staticmethod
+    def rebuild(stripe_user_id, create: bool = True) -> Optional[Entitlement]:
+        """ parse the subscription features of a StripeUser into its `Entitlement` row """
+        stripe_user = StripeUser.objects.filter(pk=stripe_user_id).first()
+        if not stripe_user:
+            return None
+
+        limits = {field: getattr(stripe_user, field) or 0 for field in Limits._fields}
+        if create:
+            entitlement, x = Entitlement.objects.update_or_create(stripe_user=stripe_user, defaults=limits)
+        else:
+            Entitlement.objects.filter(stripe_user=stripe_user).update(**limits)
+            entitlement = None
+
+        user_id = stripe_user.user_id
+        EntitlementService.invalidate(user_id)
+        transaction.on_commit(lambda: EntitlementService.invalidate(user_id))
+        return entitlement
+
+    @staticmethod
+    def get_limits(user_id: int) -> Limits:
+        return entitlement_cache.get(user_id, lambda: EntitlementService.load_limits(user_id))
+
+    @staticmethod
+    def load_limits(user_id: int) -> Limits:
+        entitlement = Entitlement.objects.filter(stripe_user__user_id=user_id).first()
+        if not entitlement:
+            stripe_user_id = StripeUser.objects.filter(user_id=user_id).values_list('pk', flat=True).first()
+            entitlement = EntitlementService.rebuild(stripe_user_id) if stripe_user_id else None
+        if not entitlement:
+            return Limits()
+        return Limits(*(getattr(entitlement, field) for field in Limits._fields))
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        entitlement_cache.delete(user_id)
+
+
+class TeamUsageService:
+
+    @staticmethod
+    def count_usage(team_id: int, fields: Iterable[str] = USAGE_FIELDS) -> dict:
+        counters = {
+            'workspace_count': lambda: Workspace.objects.filter(team_id=team_id).count(),
+            'distinct_member_count': lambda: WorkspaceRole.objects.filter(workspace__team_id=team_id)
+            .values('user_id').distinct().count(),
+            'social_account_count': lambda: SocialMediaAccount.objects.filter(workspace__team_id=team_id).count(),
+        }
+        with sharding.use_team_shard(team_id):
+            return {field: counters[field]() for field in fields}
+
+    @staticmethod
+    def reconcile(team_id: int) -> Tuple[Optional[TeamUsage], bool]:
+        """ recount usage of a team from scratch, returns the usage row and whether it had drifted """
+        with transaction.atomic():
+            if not Team.objects.filter(pk=team_id).exists():
+                return None, False
+            usage, created = TeamUsage.objects.select_for_update().get_or_create(team_id=team_id)
+            counts = TeamUsageService.count_usage(team_id)
+            drifted = created or any(getattr(usage, field) != value for field, value in counts.items())
+            if drifted:
+                for field, value in counts.items():
+                    setattr(usage, field, value)
+                usage.save()
+        return usage, drifted
+
+    @staticmethod
+    def refresh(team_id: int, *fields: str) -> None:
+        """ recount selected counters of an existing usage row """
+        TeamUsage.objects.filter(team_id=team_id).update(
+            version=F('version') + 1, updated_at=timezone.now(), **TeamUsageService.count_usage(team_id, fields)
+        )
+
+    @staticmethod
+    def get_usage(team_id: int) -> Optional[TeamUsage]:
+        usage = TeamUsage.objects.filter(team_id=team_id).first()
+        if usage:
+            return usage
+        usage, x = TeamUsageService.reconcile(team_id)
+        return usage
+
+    @staticmethod
+    def adjust(team_id: int, **deltas: int) -> None:
+        """ apply counter deltas and bump the team version """
+        changes = {field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items() if delta}
+        # A missing row is built from scratch by `get_usage` on the next quota check.
+        TeamUsage.objects.filter(team_id=team_id).update(
+            version=F('version') + 1, updated_at=timezone.now(), **changes
+        )
+
+    @staticmethod
+    def reserve(team_id: int, field: str, limit: int, amount: int = 1) -> bool:
+        """
+            Take `amount` of a quota with a single conditional UPDATE, which never lets two concurrent
+            writers overshoot `limit`. The row stays locked until the surrounding transaction ends, so
+            call it right before the insert it guards and keep that transaction short.
+        """
+        for attempt in range(2):
+            reserved = TeamUsage.objects.filter(team_id=team_id, **{f'{field}__lte': limit - amount}).update(
+                version=F('version') + 1, updated_at=timezone.now(), **{field: F(field) + amount}
+            )
+            if reserved:
+                return True
+            if attempt or TeamUsage.objects.filter(team_id=team_id).exists():
+                return False
+            TeamUsageService.reconcile(team_id)
+        return False
+
+    @staticmethod
+    def lock(team_id: int) -> None:
+        """
+            Lock the usage row of the team until the surrounding transaction ends. Concurrent membership
+            changes of the team wait here, so whether a user is new to the team is decided under the lock.
+        """
+        if not list(TeamUsage.objects.select_for_update().filter(team_id=team_id).values_list('pk', flat=True)):
+            TeamUsageService.reconcile(team_id)
+            list(TeamUsage.objects.select_for_update().filter(team_id=team_id).values_list('pk', flat=True))
+
+    @staticmethod
+    def touch(team_id: int) -> None:
+        """ bump the team version after a change that does not affect the counters """
+        TeamUsageService.adjust(team_id)
+
+    @staticmethod
+    def get_version(team_id: int) -> Optional[Tuple[int, datetime]]:
+        """ (version, updated_at) of the team, one indexed lookup """
+        return TeamUsage.objects.filter(team_id=team_id).values_list('version', 'updated_at').first()
+
+    @staticmethod
+    def members_added(team_id: int, user_ids: Iterable[int]) -> None:
+        """ count users from `user_ids` whose only role in the team is the one just created """
+        with sharding.use_team_shard(team_id):
+            new_members = WorkspaceRole.objects.filter(workspace__team_id=team_id, user_id__in=list(user_ids)) \
+                .values('user_id').annotate(roles=Count('id')).filter(roles=1).count()
+        TeamUsageService.adjust(team_id, distinct_member_count=new_members)
+
+    @staticmethod
+    def members_removed(team_id: int, user_ids: Iterable[int]) -> None:
+        """ count users from `user_ids` that no longer have any role in the team """
+        user_ids = set(user_ids)
+        with sharding.use_team_shard(team_id):
+            remaining = WorkspaceRole.objects.filter(workspace__team_id=team_id, user_id__in=user_ids) \
+                .values('user_id').distinct().count()
+        TeamUsageService.adjust(team_id, distinct_member_count=remaining - len(user_ids))
 
 
 class WorkspaceService:
 
     @staticmethod
     def can_create_workspace(team_id: int) -> bool:
-        team = Team.objects.filter(id=team_id).first()
-        if not team:
+        owner_id = Team.objects.filter(id=team_id).values_list('owner_id', flat=True).first()
+        if not owner_id:
             return False
 
-        owned_workspaces_count = Workspace.objects.filter(team=team).count()
-        return owned_workspaces_count < team.owner.stripe_user.max_workspaces
+        usage = TeamUsageService.get_usage(team_id)
+        return record_quota_check(
+            'workspaces', usage.workspace_count < EntitlementService.get_limits(owner_id).max_workspaces
+        )
 
     @staticmethod
     def create_workspace(team_id: int, name: str) -> Tuple[bool, Optional[Workspace], str]:
@@ -31,38 +211,55 @@ class WorkspaceService:
         if not name:
             return False, None, _("Workspace name cannot be empty.")
 
-        workspace = Workspace.objects.create(team_id=team_id, name=name)
+        owner_id = Team.objects.filter(id=team_id).values_list('owner_id', flat=True).get()
+        with sharding.use_team_shard(team_id), sharding.atomic():
+            max_workspaces = EntitlementService.get_limits(owner_id).max_workspaces
+            if not TeamUsageService.reserve(team_id, 'workspace_count', max_workspaces):
+                return False, None, _("User is not allowed to create new workspace.")
+            workspace = Workspace(team_id=team_id, name=name)
+            # Counted by the reservation above, the post_save receiver must not count it again.
+            workspace._usage_reserved = True
+            workspace.save()
         return True, workspace, _("Workspace created successfully.")
 
     @staticmethod
     def update_workspace_name(workspace_id: int, new_name: str) -> Tuple[bool, Optional[Workspace], str]:
-        workspace = Workspace.objects.filter(pk=workspace_id).first()
-        if not workspace:
-            return False, None, _("Workspace not found.")
         if not new_name:
+            if not Workspace.objects.filter(pk=workspace_id).exists():
+                return False, None, _("Workspace not found.")
             return False, None, _("Workspace name cannot be empty.")
 
-        workspace.name = new_name
-        workspace.save()
-        return True, workspace, _("Workspace name updated successfully.")
-
-    @staticmethod
-    def delete_workspace(workspace_id: int) -> Tuple[bool, str]:
-        workspace = Workspace.objects.filter(pk=workspace_id).first()
+        with sharding.atomic():
+            # The UPDATE ... RETURNING sends no pre_save, the freeze of a team being moved is checked here.
+            if sharding.is_sharding_enabled() and sharding.current_team.get() is None:
+                sharding.check_not_frozen(
+                    Workspace.objects.filter(pk=workspace_id).values_list('team_id', flat=True).first())
+            workspace = Workspace.objects.update_name(workspace_id, new_name)
         if not workspace:
-            return False, _("Workspace not found.")
-        if workspace.is_default:
-            return False, _("Cannot delete the initial workspace.")
-        workspace.delete()
-        return True, _("Workspace deleted successfully.")
+            return False, None, _("Workspace not found.")
+        TeamUsageService.touch(workspace.team_id)
+        return True, workspace, _("Workspace name updated successfully.")
 
     @staticmethod
+    @use_replica()
     def get_users_in_workspace(workspace_id: int) -> List[User]:
         workspace = Workspace.objects.filter(pk=workspace_id)
         if workspace.exists():
-            return workspace.first().users.all()
+            # Users live on `default`, the roles on the team's shard, so the two are not joined.
+            user_ids = list(WorkspaceRole.objects.filter(workspace_id=workspace_id).values_list('user_id', flat=True))
+            # Evaluated here, a lazy queryset would be read after `use_replica()` exits, from the primary.
+            return list(User.objects.filter(pk__in=user_ids))
         return []
 
+    @staticmethod
+    async def aget_users_in_workspace(workspace_id: int) -> List[User]:
+        """ `get_users_in_workspace` on the async ORM, reads go to the read target of the caller """
+        if not await Workspace.objects.filter(pk=workspace_id).aexists():
+            return []
+        user_ids = [user_id async for user_id in
+                    WorkspaceRole.objects.filter(workspace_id=workspace_id).values_list('user_id', flat=True)]
+        return [user async for user in User.objects.filter(pk__in=user_ids).order_by('pk')]
+
     @staticmethod
     def add_user_to_workspace(workspace_id: int, user_id: int, role: str) -> Tuple[bool, Optional[WorkspaceRole], str]:
         valid_roles = [role for role, x in Role.choices]
@@ -81,25 +278,125 @@ class WorkspaceService:
         if not user:
             return False, None, _("User not found.")
 
-        workspace_role = WorkspaceRole.objects.create(workspace=workspace, user=user, role=role)
+        with sharding.atomic():
+            TeamUsageService.lock(workspace.team_id)
+            is_new_member = not WorkspaceRole.objects.filter(user=user, workspace__team_id=workspace.team_id).exists()
+            max_users = EntitlementService.get_limits(owner_id).max_users
+            if is_new_member and not TeamUsageService.reserve(workspace.team_id, 'distinct_member_count', max_users):
+                return False, None, _("Cannot add more users to workspaces owned by this user.")
+            workspace_role = WorkspaceRole(workspace=workspace, user=user, role=role)
+            workspace_role._usage_reserved = is_new_member
+            workspace_role.save()
         return True, workspace_role, _("User added to workspace successfully.")
 
     @staticmethod
-    def remove_user_from_workspace(workspace_role_id: int) -> Tuple[bool, str]:
+    def add_users_to_workspace(workspace_id: int, members: List[dict]) -> Tuple[bool, List[dict], str]:
+        """
+            Add many `{"user_id": ..., "role": ...}` rows at once with a fixed number of queries.
+            Invalid rows are reported and skipped, the quota is checked once for the whole batch.
+        """
+        if not isinstance(members, list) or not members:
+            return False, [], _("Members must be a non-empty list.")
+        if len(members) > MAX_BULK_SIZE:
+            return False, [], _("Cannot process more than %(max)s members at once.") % {'max': MAX_BULK_SIZE}
+
+        workspace = Workspace.objects.filter(pk=workspace_id).first()
+        if not workspace:
+            return False, [], _("Workspace not found.")
+
+        valid_roles = [role for role, x in Role.choices]
+        user_ids = set()
+        for member in members:
+            try:
+                user_ids.add(int(member.get('user_id')))
+            except (AttributeError, TypeError, ValueError):
+                continue
+
+        existing_user_ids = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        team_ids_by_user = {}
+        workspace_user_ids = set()
+        for alias in sharding.each_shard():
+            for user_id, role_workspace_id, team_id in WorkspaceRole.objects.filter(user_id__in=existing_user_ids) \
+                    .values_list('user_id', 'workspace_id', 'workspace__team_id'):
+                team_ids_by_user.setdefault(user_id, set()).add(team_id)
+                if role_workspace_id == workspace.id:
+                    workspace_user_ids.add(user_id)
+
+        results, to_create, seen = [], [], set()
+        for member in members:
+            user_id = member.get('user_id') if isinstance(member, dict) else None
+            role = member.get('role') if isinstance(member, dict) else None
+            try:
+                user_id = int(user_id)
+            except (TypeError, ValueError):
+                user_id = None
+
+            if role not in valid_roles:
+                error = _("Invalid role.")
+            elif user_id not in existing_user_ids:
+                error = _("User not found.")
+            elif user_id in seen:
+                error = _("User is listed more than once.")
+            elif user_id in workspace_user_ids:
+                error = _("User is already in this workspace.")
+            elif user_id == workspace.team.owner_id:
+                error = _("The user is the owner of this team and cannot be in another team's workspace.")
+            elif team_ids_by_user.get(user_id, set()) - {workspace.team_id}:
+                error = _("The user is already in another team's workspace and cannot be added.")
+            else:
+                error = None
+                seen.add(user_id)
+                to_create.append(WorkspaceRole(workspace=workspace, user_id=user_id, role=role))
+            results.append({'user_id': user_id, 'role': role, 'success': error is None,
+                            'detail': error or _("User added to workspace successfully.")})
+
+        if not to_create:
+            return False, results, _("No users were added to workspace.")
+
+        max_users = EntitlementService.get_limits(workspace.team.owner_id).max_users
+        with sharding.atomic():
+            TeamUsageService.lock(workspace.team_id)
+            new_user_ids = {role.user_id for role in to_create}
+            new_members = len(new_user_ids - set(WorkspaceRole.objects.filter(
+                workspace__team_id=workspace.team_id, user_id__in=new_user_ids).values_list('user_id', flat=True)))
+            # bulk_create skips post_save, so the usage counters are only taken by this reservation.
+            # Members of the team take no seat, a team above its quota can still add them to other workspaces.
+            if not new_members:
+                TeamUsageService.touch(workspace.team_id)
+            elif not record_quota_check('users', TeamUsageService.reserve(
+                    workspace.team_id, 'distinct_member_count', max_users, new_members)):
+                message = _("Cannot add more users to workspaces owned by this user.")
+                for result in results:
+                    if result['success']:
+                        result['success'], result['detail'] = False, message
+                return False, results, message
+            bulk_create_with_history(to_create, WorkspaceRole, default_user=get_history_user())
+            MembershipCache.invalidate(*(role.user_id for role in to_create))
+        return True, results, _("%(count)s users added to workspace.") % {'count': len(to_create)}
+
+    @staticmethod
+    def remove_user_from_workspace(workspace_role_id: int, workspace_id: Optional[int] = None) -> Tuple[bool, str]:
         workspace_role = WorkspaceRole.objects.filter(pk=workspace_role_id)
+        if workspace_id is not None:
+            workspace_role = workspace_role.filter(workspace_id=workspace_id)
         if not workspace_role.exists():
             return False, _("Workspace role not found.")
 
-        workspace_role.delete()
+        with sharding.atomic():
+            workspace_role.delete()
         return True, _("User removed from workspace successfully.")
 
     @staticmethod
-    def update_user_role_in_workspace(workspace_role_id: int, role: str) -> Tuple[bool, Optional[WorkspaceRole], str]:
+    def update_user_role_in_workspace(workspace_role_id: int, role: str, workspace_id: Optional[int] = None) -> \
+            Tuple[bool, Optional[WorkspaceRole], str]:
         valid_roles = [role for role, x in Role.choices]
         if role not in valid_roles:
             return False, None, _("Invalid role.")
 
-        workspace_role = WorkspaceRole.objects.filter(pk=workspace_role_id).first()
+        workspace_role = WorkspaceRole.objects.filter(pk=workspace_role_id)
+        if workspace_id is not None:
+            workspace_role = workspace_role.filter(workspace_id=workspace_id)
+        workspace_role = workspace_role.first()
         if not workspace_role:
             return False, None, _("Workspace role not found.")
 
@@ -108,36 +405,128 @@ class WorkspaceService:
         return True, workspace_role, _("User role updated successfully.")
 
     @staticmethod
-    def can_add_user_to_owned_workspaces(owner_id: int) -> bool:
-        owner = User.objects.filter(id=owner_id).first()
-        if not owner:
-            return False
+    def update_user_roles_in_workspace(workspace_id: int, changes: List[dict]) -> Tuple[bool, List[dict], str]:
+        """ apply many `{"workspace_role_id": ..., "role": ...}` changes with one bulk UPDATE """
+        if not isinstance(changes, list) or not changes:
+            return False, [], _("Roles must be a non-empty list.")
+        if len(changes) > MAX_BULK_SIZE:
+            return False, [], _("Cannot process more than %(max)s roles at once.") % {'max': MAX_BULK_SIZE}
 
-        workspaces = Workspace.objects.filter(team__owner=owner)
-        unique_users = {user for workspace in workspaces for user in workspace.users.all()}
-        total_users = len(unique_users)
+        valid_roles = [role for role, x in Role.choices]
+        # Ids are only collected once known to be numbers, a list or dict sent as an id is not hashable.
+        role_ids = {int(change['workspace_role_id']) for change in changes
+                    if isinstance(change, dict) and str(change.get('workspace_role_id')).isdigit()}
+        workspace_roles = WorkspaceRole.objects.filter(workspace_id=workspace_id, pk__in=role_ids).in_bulk()
+
+        now = timezone.now()
+        results, to_update = [], {}
+        for change in changes:
+            role_id = change.get('workspace_role_id') if isinstance(change, dict) else None
+            role = change.get('role') if isinstance(change, dict) else None
+            workspace_role = workspace_roles.get(int(role_id)) if str(role_id).isdigit() else None
+
+            if role not in valid_roles:
+                error = _("Invalid role.")
+            elif not workspace_role:
+                error = _("Workspace role not found.")
+            else:
+                error = None
+                workspace_role.role = role
+                workspace_role.updated_at = now
+                to_update[workspace_role.pk] = workspace_role
+            results.append({'workspace_role_id': role_id, 'role': role, 'success': error is None,
+                            'detail': error or _("User role updated successfully.")})
+
+        if not to_update:
+            return False, results, _("No user roles were updated.")
+
+        with sharding.atomic():
+            bulk_update_with_history(list(to_update.values()), WorkspaceRole, ['role', 'updated_at'],
+                                     default_user=get_history_user())
+            TeamUsageService.touch(Workspace.objects.filter(pk=workspace_id).values_list('team_id', flat=True).get())
+            MembershipCache.invalidate(*(role.user_id for role in to_update.values()))
+        return True, results, _("%(count)s user roles updated.") % {'count': len(to_update)}
 
-        return total_users < owner.stripe_user.max_users
+    @staticmethod
+    def remove_users_from_workspace(workspace_id: int, workspace_role_ids: List[int]) -> \
+            Tuple[bool, List[dict], str]:
+        """
+            remove many workspace roles with a single DELETE ... WHERE id IN. The DELETE bypasses the collector
+            and with it the delete signals of WorkspaceRole, what their receivers do is done here instead:
+            the '-' history rows of simple_history, the usage and membership updates of `workspace_role_deleted`
+            and the freeze check of `sharded_row_written`.
+        """
+        if not isinstance(workspace_role_ids, list) or not workspace_role_ids:
+            return False, [], _("Workspace role ids must be a non-empty list.")
+        if len(workspace_role_ids) > MAX_BULK_SIZE:
+            return False, [], _("Cannot process more than %(max)s roles at once.") % {'max': MAX_BULK_SIZE}
+
+        team_id = Workspace.objects.filter(pk=workspace_id).values_list('team_id', flat=True).first()
+        if not team_id:
+            return False, [], _("Workspace not found.")
+
+        workspace_roles = WorkspaceRole.objects.filter(workspace_id=workspace_id, pk__in=[
+            role_id for role_id in workspace_role_ids if str(role_id).isdigit()
+        ]).in_bulk()
+
+        results = []
+        for role_id in workspace_role_ids:
+            found = str(role_id).isdigit() and int(role_id) in workspace_roles
+            results.append({'workspace_role_id': role_id, 'success': found,
+                            'detail': _("User removed from workspace successfully.") if found
+                            else _("Workspace role not found.")})
+
+        if not workspace_roles:
+            return False, results, _("No users were removed from workspace.")
+
+        sharding.check_not_frozen(team_id)
+        history_user, now = get_history_user(), timezone.now()
+        historical_roles = []
+        for workspace_role in workspace_roles.values():
+            historical_role = WorkspaceRole.history.model(history_type='-', history_date=now, history_user=history_user)
+            for field in WorkspaceRole._meta.concrete_fields:
+                setattr(historical_role, field.attname, getattr(workspace_role, field.attname))
+            historical_roles.append(historical_role)
+
+        with sharding.atomic():
+            WorkspaceRole.history.model.objects.bulk_create(historical_roles)
+            # Nothing references WorkspaceRole, so the collector and its per-row signals are skipped.
+            using = router.db_for_write(WorkspaceRole)
+            WorkspaceRole.objects.using(using).filter(pk__in=list(workspace_roles))._raw_delete(using)
+            TeamUsageService.members_removed(team_id, {role.user_id for role in workspace_roles.values()})
+            MembershipCache.invalidate(*(role.user_id for role in workspace_roles.values()))
+        return True, results, _("%(count)s users removed from workspace.") % {'count': len(workspace_roles)}
 
     @staticmethod
+    def can_add_user_to_owned_workspaces(owner_id: int) -> bool:
+        # An unknown owner has no entitlement, so all of its limits are 0.
+        team_id = Team.objects.filter(owner_id=owner_id).values_list('id', flat=True).first()
+        total_users = TeamUsageService.get_usage(team_id).distinct_member_count if team_id else 0
+
+        return record_quota_check('users', total_users < EntitlementService.get_limits(owner_id).max_users)
+
+    @staticmethod
+    @use_replica()
     def get_social_media_accounts_in_workspace(workspace_id: int) -> List[SocialMediaAccount]:
-        workspace = Workspace.objects.filter(pk=workspace_id)
-        if workspace.exists():
-            workspace = workspace.first()
-            return workspace.social_media_accounts.all()
-        return InstagramAccount.objects.none()
+        workspace = Workspace.objects.filter(pk=workspace_id).first()
+        if workspace:
+            return list(workspace.social_media_accounts.all())
+        return []
 
     @staticmethod
-    def can_add_social_media_account_to_owner_workspaces(owner_id: int) -> Tuple[bool, int]:
-        owner = User.objects.filter(pk=owner_id)
-        if not owner or not owner.subscription:
-            return False, 0
+    async def aget_social_media_accounts_in_workspace(workspace_id: int) -> List[SocialMediaAccount]:
+        """ `get_social_media_accounts_in_workspace` on the async ORM, the accounts are returned as a list """
+        workspace = await Workspace.objects.filter(pk=workspace_id).afirst()
+        if workspace is None:
+            return []
+        return [account async for account in workspace.social_media_accounts.order_by('pk')]
 
-        workspaces = Workspace.objects.filter(team__owner_id=owner_id)
-        total_social_media_accounts = 0
-        for workspace in workspaces:
-            total_social_media_accounts += workspace.social_media_accounts.count()
-        return total_social_media_accounts < owner.stripe_user.max_socials, total_social_media_accounts
+    @staticmethod
+    def can_add_social_media_account_to_owner_workspaces(owner_id: int) -> Tuple[bool, int]:
+        team_id = Team.objects.filter(owner_id=owner_id).values_list('id', flat=True).first()
+        total_social_media_accounts = TeamUsageService.get_usage(team_id).social_account_count if team_id else 0
+        max_socials = EntitlementService.get_limits(owner_id).max_socials
+        return record_quota_check('socials', total_social_media_accounts < max_socials), total_social_media_accounts
 
     @staticmethod
     def add_social_media_account_to_workspace(workspace_id: int, account_id: int) -> \
@@ -151,12 +540,27 @@ class WorkspaceService:
         if not can_add:
             return False, None, _("Cannot add more social media accounts to this owner's workspaces.")
 
-        account = SocialMediaAccount.objects.filter(pk=account_id)
-        if not account.exists():
+        # Accounts of the team's shard, or unattached ones, which belong to no team and stay on `default`.
+        account = SocialMediaAccount.objects.filter(pk=account_id).first() \
+            or SocialMediaAccount.objects.using(DEFAULT_DB_ALIAS).filter(pk=account_id, workspace__isnull=True).first()
+        if not account:
             return False, None, _("Social media account not found.")
 
-        account.workspace = workspace
-        account.save()
+        with sharding.use_team_shard(workspace.team_id), sharding.atomic():
+            old_team_id = Workspace.objects.filter(pk=account.workspace_id).values_list('team_id', flat=True).first()
+            moves_in = old_team_id != workspace.team_id
+            max_socials = EntitlementService.get_limits(workspace.team.owner_id).max_socials
+            if moves_in and not TeamUsageService.reserve(workspace.team_id, 'social_account_count', max_socials):
+                return False, None, _("Cannot add more social media accounts to this owner's workspaces.")
+            # An unattached account is read from `default`, saved through the router it would be inserted on the
+            # team's shard next to the original.
+            target = get_shard()
+            if account._state.db != target:
+                sharding.move_account(account.pk, account._state.db, target)
+                account._state.db = target
+            account.workspace = workspace
+            account._usage_reserved = moves_in
+            account.save(using=target)
         return True, account, _("Social media account added to workspace successfully.")
 
     @staticmethod
@@ -171,6 +575,94 @@ class WorkspaceService:
             return False, None, _("Social media account not found.")
 
         account = workspace.social_media_accounts.get(pk=account_id)
-        account.workspace = None
-        account.save()
+        with sharding.atomic():
+            account.workspace = None
+            account.save()
         return True, account, _("Social media account removed from workspace successfully.")
+
+
+class WorkspaceDeletionService:
+
+    @staticmethod
+    def schedule(workspace_id: int) -> Tuple[bool, Optional[WorkspaceDeletion], str]:
+        """ hide the workspace right away and queue the `delete_workspace` task that removes it """
+        from workspace.tasks import delete_workspace
+
+        workspace = Workspace.objects.filter(pk=workspace_id).first()
+        if not workspace:
+            return False, None, _("Workspace not found.")
+        if workspace.is_default:
+            return False, None, _("Cannot delete the initial workspace.")
+        if workspace.is_pending_deletion:
+            return True, WorkspaceDeletionService.get_scheduled(workspace.id), \
+                _("Workspace deletion is already in progress.")
+
+        user_ids = list(WorkspaceRole.objects.filter(workspace=workspace).values_list('user_id', flat=True))
+        total = len(user_ids) + SocialMediaAccount.objects.filter(workspace=workspace).count() + 1
+        with sharding.atomic():
+            # Only the request that flips the flag schedules, a concurrent one waits for its commit and sees it set.
+            claimed = Workspace.objects.filter(pk=workspace.id, is_pending_deletion=False) \
+                .update(is_pending_deletion=True, updated_at=timezone.now())
+            if claimed != 1:
+                return True, WorkspaceDeletionService.get_scheduled(workspace.id), \
+                    _("Workspace deletion is already in progress.")
+            deletion = WorkspaceDeletion.objects.create(team_id=workspace.team_id, workspace_id=workspace.id,
+                                                        total=total)
+            TeamUsageService.touch(workspace.team_id)
+            MembershipCache.invalidate_team_owner(workspace.team_id)
+            MembershipCache.invalidate(*user_ids)
+            transaction.on_commit(lambda: delete_workspace.delay(deletion.pk))
+        return True, deletion, _("Workspace deletion scheduled.")
+
+    @staticmethod
+    def get_scheduled(workspace_id: int) -> Optional[WorkspaceDeletion]:
+        return WorkspaceDeletion.objects.filter(workspace_id=workspace_id).order_by('-id').first()
+
+    @staticmethod
+    def run(deletion_id: int, batch_size: int = DELETION_BATCH_SIZE) -> Optional[WorkspaceDeletion]:
+        """
+            Remove roles and detach social media accounts in batches of `batch_size`, each batch in its own
+            short transaction, then delete the emptied workspace. Safe to re-run after a failure.
+        """
+        deletion = WorkspaceDeletion.objects.filter(pk=deletion_id).first()
+        if not deletion or deletion.status == DeletionStatus.DONE:
+            return deletion
+
+        with sharding.use_team_shard(deletion.team_id):
+            deletions = WorkspaceDeletion.objects.filter(pk=deletion_id)
+            deletions.update(status=DeletionStatus.RUNNING, error='', updated_at=timezone.now())
+            workspace_id, team_id = deletion.workspace_id, deletion.team_id
+            try:
+                while True:
+                    role_ids = list(WorkspaceRole.objects.filter(workspace_id=workspace_id).order_by('pk')
+                                    .values_list('pk', flat=True)[:batch_size])
+                    if not role_ids:
+                        break
+                    WorkspaceService.remove_users_from_workspace(workspace_id, role_ids)
+                    deletions.update(deleted=F('deleted') + len(role_ids), updated_at=timezone.now())
+
+                while True:
+                    account_ids = list(SocialMediaAccount.objects.filter(workspace_id=workspace_id).order_by('pk')
+                                       .values_list('pk', flat=True)[:batch_size])
+                    if not account_ids:
+                        break
+                    with sharding.atomic():
+                        # A queryset update skips post_save, so the usage counter is adjusted here.
+                        SocialMediaAccount.objects.filter(pk__in=account_ids).update(workspace=None)
+                        TeamUsageService.adjust(team_id, social_account_count=-len(account_ids))
+                    deletions.update(deleted=F('deleted') + len(account_ids), updated_at=timezone.now())
+
+                with sharding.atomic():
+                    workspace = Workspace.objects.filter(pk=workspace_id).first()
+                    if workspace:
+                        workspace.delete()
+                    deletions.update(status=DeletionStatus.DONE, deleted=F('total'), updated_at=timezone.now())
+            except sharding.TeamMoving:
+                deletions.update(status=DeletionStatus.PENDING, updated_at=timezone.now())
+                raise
+            except Exception as e:
+                deletions.update(status=DeletionStatus.FAILED, error=str(e), updated_at=timezone.now())
+                raise
+
+        deletion.refresh_from_db()
+        return deletion
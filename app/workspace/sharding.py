@@ -0,0 +1,256 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import QuerySet
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from app.db_routers import get_shard, use_shard
+from social_media.models import SocialMediaAccount
+from workspace.cache import TwoTierCache
+from workspace.models import Workspace, WorkspaceRole, TeamShard
+
+shard_cache = TwoTierCache('team-shard', timeout=60 * 60)
+# Team whose rows the current request or task writes, checked against the freeze of a move.
+current_team: ContextVar[Optional[int]] = ContextVar('current_team', default=None)
+
+# Writes of a team are refused while it is frozen, an interrupted move unfreezes it after this many seconds.
+FREEZE_TIMEOUT = 10 * 60
+
+
+class TeamMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("The team is being moved, try again shortly.")
+    default_code = 'team_moving'
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+def is_sharding_enabled() -> bool:
+    return len(settings.TENANT_SHARDS) > 1
+
+
+class ShardMap:
+    """ database alias of every team, read through the two-tier cache """
+
+    @staticmethod
+    def get(team_id: Optional[int]) -> str:
+        if not team_id or not is_sharding_enabled():
+            return DEFAULT_DB_ALIAS
+        return shard_cache.get(team_id, lambda: ShardMap.load(team_id))
+
+    @staticmethod
+    def load(team_id: int) -> str:
+        alias = TeamShard.objects.filter(team_id=team_id).values_list('alias', flat=True).first()
+        return alias or DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def assign(team_id: int, alias: str) -> None:
+        TeamShard.objects.update_or_create(team_id=team_id, defaults={'alias': alias})
+        ShardMap.invalidate(team_id)
+
+    @staticmethod
+    def invalidate(team_id: int) -> None:
+        shard_cache.delete(team_id)
+
+    @staticmethod
+    def freeze(team_id: int) -> None:
+        cache.set(f'team-shard-frozen:{team_id}', 1, FREEZE_TIMEOUT)
+
+    @staticmethod
+    def unfreeze(team_id: int) -> None:
+        cache.delete(f'team-shard-frozen:{team_id}')
+
+    @staticmethod
+    def is_frozen(team_id: Optional[int]) -> bool:
+        return bool(team_id and is_sharding_enabled() and cache.get(f'team-shard-frozen:{team_id}'))
+
+
+def check_not_frozen(team_id: Optional[int]) -> None:
+    if ShardMap.is_frozen(team_id):
+        raise TeamMoving()
+
+
+@contextmanager
+def use_team_shard(team_id: Optional[int]):
+    token = current_team.set(team_id)
+    try:
+        with use_shard(ShardMap.get(team_id)):
+            yield
+    finally:
+        current_team.reset(token)
+
+
+def each_shard() -> Iterator[str]:
+    """ enter every shard in turn, for lookups by user that cannot be resolved from a team """
+    for alias in settings.TENANT_SHARDS:
+        with use_shard(alias):
+            yield alias
+
+
+@contextmanager
+def atomic():
+    """
+        transaction on `default` and, when it is another database, on the current shard as well.
+        Raises `TeamMoving` while the current team is frozen by `move_team`.
+    """
+    check_not_frozen(current_team.get())
+    with ExitStack() as stack:
+        stack.enter_context(transaction.atomic())
+        if get_shard() != DEFAULT_DB_ALIAS:
+            stack.enter_context(transaction.atomic(using=get_shard()))
+        yield
+
+
+def on_commit(func: Callable[[], None]) -> None:
+    """ run `func` once the transactions of `default` and of the current shard commit, right away outside them """
+    transaction.on_commit(func)
+    if get_shard() != DEFAULT_DB_ALIAS:
+        transaction.on_commit(func, using=get_shard())
+
+
+def _account_models() -> List[type]:
+    # Multi-table children of SocialMediaAccount keep their own rows.
+    return [SocialMediaAccount, *(model for model in SocialMediaAccount.__subclasses__() if not model._meta.proxy)]
+
+
+def _team_querysets(team_id: int, alias: str) -> List[Tuple[type, QuerySet]]:
+    """ (model, queryset) of every table holding rows of the team, parents before children """
+    models = [Workspace, WorkspaceRole, WorkspaceRole.history.model, *_account_models()]
+    querysets = []
+    for model in models:
+        lookup = 'team_id' if model is Workspace else 'workspace__team_id'
+        querysets.append((model, model._base_manager.using(alias).filter(**{lookup: team_id}).order_by('pk')))
+    return querysets
+
+
+def _copy_rows(model, objs: list, target: str, upsert: bool) -> None:
+    """ insert rows with their primary keys into `target`, only the model's own table of a multi-table child """
+    fields = list(model._meta.local_concrete_fields)
+    update_fields = [field for field in fields if not field.primary_key]
+    on_conflict = None
+    if upsert:
+        on_conflict = OnConflict.UPDATE if update_fields else OnConflict.IGNORE
+    model._base_manager.using(target)._insert(
+        objs, fields=fields, raw=True, using=target, on_conflict=on_conflict,
+        update_fields=update_fields if on_conflict == OnConflict.UPDATE else None,
+        unique_fields=[model._meta.pk] if on_conflict == OnConflict.UPDATE else None,
+    )
+
+
+def _batches(queryset: QuerySet, batch_size: int) -> Iterator[list]:
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def copy_team(team_id: int, source: str, target: str, batch_size: int,
+              since: Optional[datetime] = None) -> int:
+    """ copy the team's rows from `source` to `target`, with `since` only rows changed after it, upserted """
+    copied = 0
+    for model, queryset in _team_querysets(team_id, source):
+        if since is not None:
+            changed = {'history_date__gte': since} if model is WorkspaceRole.history.model else \
+                {'updated_at__gte': since} if model in (Workspace, WorkspaceRole) else {}
+            queryset = queryset.filter(**changed)
+        for batch in _batches(queryset, batch_size):
+            with transaction.atomic(using=target):
+                _copy_rows(model, batch, target, upsert=since is not None)
+            copied += len(batch)
+    return copied
+
+
+def drop_missing(team_id: int, source: str, target: str) -> int:
+    """ delete rows from `target` that were deleted from `source` while the team was copied """
+    dropped = 0
+    source_querysets = dict(_team_querysets(team_id, source))
+    for model, queryset in reversed(_team_querysets(team_id, target)):
+        missing = set(queryset.values_list('pk', flat=True)) - set(source_querysets[model].values_list('pk', flat=True))
+        if missing:
+            model._base_manager.using(target).filter(pk__in=missing)._raw_delete(target)
+            dropped += len(missing)
+    return dropped
+
+
+def move_account(account_id: int, source: str, target: str) -> None:
+    """ move the rows of one social media account, those of its multi-table child included, to `target` """
+    models = _account_models()
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        for model in models:
+            rows = list(model._base_manager.using(source).filter(pk=account_id))
+            if rows:
+                _copy_rows(model, rows, target, upsert=False)
+        for model in reversed(models):
+            model._base_manager.using(source).filter(pk=account_id)._raw_delete(source)
+
+
+def purge_team(team_id: int, alias: str, batch_size: int) -> int:
+    """ delete the team's rows from `alias` in batches, children first, without signals """
+    purged = 0
+    for model, queryset in reversed(_team_querysets(team_id, alias)):
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            model._base_manager.using(alias).filter(pk__in=pks)._raw_delete(alias)
+            purged += len(pks)
+    return purged
+
+
+def move_team(team_id: int, target: str, batch_size: int = 1000, settle: float = 2,
+              log: Callable[[str], None] = lambda message: None) -> None:
+    """
+        Move the team to the `target` shard while it stays readable:
+        copy every row, freeze writes, wait `settle` seconds for in-flight requests, copy what changed
+        meanwhile, switch the shard map and unfreeze once every process sees it. Rows are purged from the
+        old shard last. A failed move removes its partial copy from the target.
+    """
+    if target not in settings.TENANT_SHARDS:
+        raise ShardMoveError(f'{target} is not one of TENANT_SHARDS.')
+    source = ShardMap.get(team_id)
+    if source == target:
+        raise ShardMoveError(f'Team {team_id} already lives on {target}.')
+    # Rows keep their primary keys, shards must use disjoint id ranges.
+    workspace_ids = list(Workspace.objects.using(source).filter(team_id=team_id).values_list('pk', flat=True))
+    if Workspace.objects.using(target).filter(pk__in=workspace_ids).exists():
+        raise ShardMoveError(f'Workspace ids of team {team_id} are already taken on {target}.')
+
+    started = timezone.now()
+    try:
+        log(f'Copied {copy_team(team_id, source, target, batch_size)} rows from {source} to {target}.')
+        ShardMap.freeze(team_id)
+        time.sleep(settle)
+        # Deleted rows go first, a role removed and added again meanwhile comes back with a new pk.
+        log(f'Dropped {drop_missing(team_id, source, target)} deleted rows.')
+        log(f'Copied {copy_team(team_id, source, target, batch_size, since=started)} changed rows.')
+    except Exception:
+        # Nothing reads the target yet, drop the partial copy so that the move can be retried.
+        purge_team(team_id, target, batch_size)
+        ShardMap.unfreeze(team_id)
+        raise
+
+    try:
+        ShardMap.assign(team_id, target)
+        # Other processes read the old alias from their local tier until it expires, stay frozen until then
+        # so that none of them writes to the source, which is purged next.
+        time.sleep(shard_cache.local.timeout)
+    finally:
+        ShardMap.unfreeze(team_id)
+
+    log(f'Purged {purge_team(team_id, source, batch_size)} rows from {source}.')
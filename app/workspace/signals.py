@@ -0,0 +1,244 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from app.db_routers import is_sharded
+from core.models import Team
+from social_media.models import SocialMediaAccount
+from subscription.models import StripeUser, Subscription, SubscriptionItem, Price, Product, ProductFeature, Feature
+from workspace.models import Workspace, WorkspaceRole
+from workspace.authentication import invalidate_tokens, invalidate_user_tokens
+from workspace.membership import MembershipCache
+from workspace.services import TeamUsageService, EntitlementService
+from workspace.sharding import check_not_frozen, current_team, is_sharding_enabled
+
+User = get_user_model()
+
+
+def _team_ids(workspace_ids):
+    return dict(Workspace.objects.filter(pk__in=[pk for pk in workspace_ids if pk]).values_list('id', 'team_id'))
+
+
+def sharded_row_written(sender, instance, **kwargs):
+    """ saves outside the services (admin, signals, tasks) honour the freeze of a team being moved too """
+    if not is_sharding_enabled():
+        return
+    team_id = current_team.get()
+    if team_id is None and isinstance(instance, Workspace):
+        team_id = instance.team_id
+    elif team_id is None:
+        team_id = _team_ids([instance.workspace_id]).get(instance.workspace_id)
+    check_not_frozen(team_id)
+
+
+@receiver(m2m_changed, sender=Workspace.users.through)
+def workspace_users_changing(sender, instance, action, reverse, pk_set, **kwargs):
+    """ `workspace.users.add()` and friends write the roles without `pre_save`, the freeze is checked here """
+    if action not in ('pre_add', 'pre_remove', 'pre_clear') or not is_sharding_enabled():
+        return
+    if not reverse:
+        team_ids = {instance.team_id}
+    elif pk_set is None:
+        team_ids = set(instance.associated_workspaces.values_list('team_id', flat=True))
+    else:
+        team_ids = set(_team_ids(pk_set).values())
+    for team_id in team_ids:
+        check_not_frozen(team_id)
+
+
+@receiver(post_save, sender=Workspace)
+def workspace_saved(sender, instance, created, **kwargs):
+    if created:
+        if not getattr(instance, '_usage_reserved', False):
+            TeamUsageService.adjust(instance.team_id, workspace_count=1)
+        MembershipCache.invalidate_team_owner(instance.team_id)
+    else:
+        TeamUsageService.touch(instance.team_id)
+
+
+@receiver(post_delete, sender=Workspace)
+def workspace_deleted(sender, instance, **kwargs):
+    TeamUsageService.adjust(instance.team_id, workspace_count=-1)
+    MembershipCache.invalidate_team_owner(instance.team_id)
+    # Accounts detached by the deletion are not saved one by one, so they are recounted instead.
+    TeamUsageService.refresh(instance.team_id, 'social_account_count')
+
+
+@receiver(post_save, sender=WorkspaceRole)
+def workspace_role_saved(sender, instance, created, **kwargs):
+    MembershipCache.invalidate(instance.user_id)
+    if created and getattr(instance, '_usage_reserved', False):
+        return
+    if created:
+        TeamUsageService.members_added(instance.workspace.team_id, [instance.user_id])
+    else:
+        TeamUsageService.touch(instance.workspace.team_id)
+
+
+@receiver(post_delete, sender=WorkspaceRole)
+def workspace_role_deleted(sender, instance, **kwargs):
+    MembershipCache.invalidate(instance.user_id)
+    team_id = _team_ids([instance.workspace_id]).get(instance.workspace_id)
+    if team_id:
+        TeamUsageService.members_removed(team_id, [instance.user_id])
+
+
+@receiver(m2m_changed, sender=Workspace.users.through)
+def workspace_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """ `workspace.users.add()` and friends bypass `WorkspaceRole.save`, so membership is counted here """
+    if action == 'pre_clear':
+        if reverse:
+            instance._usage_team_ids = set(instance.associated_workspaces.values_list('team_id', flat=True))
+            instance._cleared_user_ids = {instance.pk}
+        else:
+            instance._usage_team_ids = {instance.team_id}
+            instance._cleared_user_ids = set(instance.roles.values_list('user_id', flat=True))
+        return
+    if action == 'post_clear':
+        for team_id in getattr(instance, '_usage_team_ids', ()):
+            TeamUsageService.refresh(team_id, 'distinct_member_count')
+        MembershipCache.invalidate(*getattr(instance, '_cleared_user_ids', ()))
+        return
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    MembershipCache.invalidate(*([instance.pk] if reverse else pk_set))
+
+    handler = TeamUsageService.members_added if action == 'post_add' else TeamUsageService.members_removed
+    if not reverse:
+        handler(instance.team_id, pk_set)
+        return
+    for team_id in set(_team_ids(pk_set).values()):
+        handler(team_id, [instance.pk])
+
+
+def social_media_account_initialized(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads do not trigger a refresh query.
+    instance._usage_workspace_id = instance.__dict__.get('workspace_id')
+
+
+def social_media_account_saved(sender, instance, created, **kwargs):
+    old_workspace_id = None if created else getattr(instance, '_usage_workspace_id', None)
+    new_workspace_id = instance.workspace_id
+    instance._usage_workspace_id = new_workspace_id
+    reserved, instance._usage_reserved = getattr(instance, '_usage_reserved', False), False
+    if old_workspace_id == new_workspace_id:
+        if new_workspace_id:
+            TeamUsageService.touch(_team_ids([new_workspace_id]).get(new_workspace_id))
+        return
+
+    team_ids = _team_ids([old_workspace_id, new_workspace_id])
+    old_team_id, new_team_id = team_ids.get(old_workspace_id), team_ids.get(new_workspace_id)
+    if old_team_id == new_team_id:
+        TeamUsageService.touch(new_team_id)
+        return
+    if old_team_id:
+        TeamUsageService.adjust(old_team_id, social_account_count=-1)
+    if new_team_id and not reserved:
+        TeamUsageService.adjust(new_team_id, social_account_count=1)
+
+
+def social_media_account_deleted(sender, instance, **kwargs):
+    # Multi-table children are deleted together with their parent row, count the parent only.
+    if instance._meta.concrete_model is not SocialMediaAccount or not instance.workspace_id:
+        return
+    team_id = _team_ids([instance.workspace_id]).get(instance.workspace_id)
+    if team_id:
+        TeamUsageService.adjust(team_id, social_account_count=-1)
+
+
+def connect_sharded_model_receivers(models):
+    """ connect the freeze check to the sharded models only, called from `WorkspaceConfig.ready` """
+    for model in models:
+        if is_sharded(model):
+            pre_save.connect(sharded_row_written, sender=model)
+            pre_delete.connect(sharded_row_written, sender=model)
+
+
+def connect_social_media_account_receivers(models):
+    """
+        Connect the account receivers to SocialMediaAccount and each of its subclasses, called from
+        `WorkspaceConfig.ready` once all models are loaded. Without a sender they would run for every row of
+        every model.
+    """
+    for model in models:
+        if issubclass(model, SocialMediaAccount):
+            post_init.connect(social_media_account_initialized, sender=model)
+            post_save.connect(social_media_account_saved, sender=model)
+            post_delete.connect(social_media_account_deleted, sender=model)
+
+
+def _rebuild_entitlements(stripe_user_ids, signal):
+    # Rows deleted by a cascade must not recreate the entitlement of a StripeUser that is going away.
+    create = signal is post_save
+    for stripe_user_id in set(stripe_user_ids):
+        if stripe_user_id:
+            EntitlementService.rebuild(stripe_user_id, create=create)
+
+
+@receiver([post_save, post_delete], sender=StripeUser)
+def stripe_user_changed(sender, instance, signal, **kwargs):
+    if signal is post_save:
+        EntitlementService.rebuild(instance.pk)
+    else:
+        EntitlementService.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(sender, instance, signal, **kwargs):
+    _rebuild_entitlements([instance.stripe_user_id], signal)
+
+
+@receiver([post_save, post_delete], sender=SubscriptionItem)
+def subscription_item_changed(sender, instance, signal, **kwargs):
+    stripe_user_ids = Subscription.objects.filter(pk=instance.subscription_id).values_list('stripe_user', flat=True)
+    _rebuild_entitlements(stripe_user_ids, signal)
+
+
+@receiver([post_save, post_delete], sender=Price)
+def price_changed(sender, instance, signal, **kwargs):
+    stripe_user_ids = SubscriptionItem.objects.filter(price=instance) \
+        .values_list('subscription__stripe_user', flat=True)
+    _rebuild_entitlements(stripe_user_ids, signal)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, signal, **kwargs):
+    stripe_user_ids = SubscriptionItem.objects.filter(price__product=instance) \
+        .values_list('subscription__stripe_user', flat=True)
+    _rebuild_entitlements(stripe_user_ids, signal)
+
+
+@receiver([post_save, post_delete], sender=ProductFeature)
+def product_feature_changed(sender, instance, signal, **kwargs):
+    stripe_user_ids = SubscriptionItem.objects.filter(price__product__pk=instance.product_id) \
+        .values_list('subscription__stripe_user', flat=True)
+    # Adding or removing a feature of a product is a plan change, existing entitlements are updated.
+    _rebuild_entitlements(stripe_user_ids, post_save)
+
+
+@receiver([post_save, post_delete], sender=Feature)
+def feature_changed(sender, instance, signal, **kwargs):
+    product_ids = ProductFeature.objects.filter(feature=instance).values_list('product', flat=True)
+    stripe_user_ids = SubscriptionItem.objects.filter(price__product__pk__in=list(product_ids)) \
+        .values_list('subscription__stripe_user', flat=True)
+    _rebuild_entitlements(stripe_user_ids, signal)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Covers deactivation and password changes.
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Team)
+def team_changed(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.owner_id)
+    MembershipCache.invalidate(instance.owner_id)
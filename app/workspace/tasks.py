@@ -0,0 +1,50 @@
+import logging
+
+from celery import shared_task
+
+from core.models import Team
+from subscription.models import StripeUser
+from workspace.services import TeamUsageService, EntitlementService, WorkspaceDeletionService
+from workspace.sharding import TeamMoving
+
+logger = logging.getLogger(__name__)
+
+TEAM_MOVING_RETRY_DELAY = 30
+
+
+@shared_task
+def reconcile_team_usage() -> int:
+    """ repair drift of the denormalized `TeamUsage` counters, returns the number of repaired teams """
+    repaired = 0
+    for team_id in Team.objects.values_list('id', flat=True).iterator():
+        usage, drifted = TeamUsageService.reconcile(team_id)
+        if drifted:
+            repaired += 1
+            logger.info("Team %s usage reconciled.", team_id)
+    return repaired
+
+
+@shared_task
+def rebuild_entitlements() -> int:
+    """ rebuild every `Entitlement`, catches subscriptions that expired without a write """
+    rebuilt = 0
+    for stripe_user_id in StripeUser.objects.values_list('pk', flat=True).iterator():
+        EntitlementService.rebuild(stripe_user_id)
+        rebuilt += 1
+    return rebuilt
+
+
+@shared_task(bind=True, acks_late=True, max_retries=None)
+def delete_workspace(self, deletion_id: int) -> str:
+    """ remove a workspace scheduled by `WorkspaceDeletionService.schedule`, returns the final status """
+    try:
+        deletion = WorkspaceDeletionService.run(deletion_id)
+    except TeamMoving as exc:
+        # The team is frozen by a move, its rows are deleted on the new shard once the move is done.
+        raise self.retry(exc=exc, countdown=TEAM_MOVING_RETRY_DELAY)
+    if not deletion:
+        logger.warning("Workspace deletion %s not found.", deletion_id)
+        return ''
+    logger.info("Workspace %s deletion %s: %s/%s.", deletion.workspace_id, deletion.status,
+                deletion.deleted, deletion.total)
+    return deletion.status
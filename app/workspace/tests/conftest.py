@@ -1,13 +1,26 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from core.models import Team
-from workspace.models import Workspace
 from subscription.models import Subscription, Price, ProductFeature, Feature, Product, SubscriptionItem, StripeUser
+from workspace.cache import TwoTierCache
+from workspace.dataset import build_tenant
+from workspace.models import Workspace
+from workspace.tests.query_budget import QueryRecorder
 
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    TwoTierCache.clear_local()
+    yield
+    cache.clear()
+    TwoTierCache.clear_local()
+
+
 @pytest.fixture
 def user():
     user_data = {
@@ -54,3 +67,15 @@ def team(user):
 @pytest.fixture
 def workspace(team):
     return Workspace.objects.create(name="Test Workspace", team=team)
+
+
+@pytest.fixture
+def tenant_factory():
+    """ `workspace.dataset.build_tenant`, a bulk-inserted team of configurable size """
+    return build_tenant
+
+
+@pytest.fixture
+def query_recorder():
+    """ returns a fresh `QueryRecorder`, use `with recorder.record():` around the measured code """
+    return QueryRecorder
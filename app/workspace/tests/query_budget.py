@@ -0,0 +1,49 @@
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+import pytest
+from django.conf import settings
+from django.db import connection
+
+
+class QueryRecorder:
+    """ `execute_wrapper` collecting every executed query together with the stack that issued it """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, traceback.extract_stack()[:-1]))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @contextmanager
+    def record(self):
+        with connection.execute_wrapper(self):
+            yield self
+
+
+def format_stack(stack):
+    """ keep the project frames only, library frames hide where a query comes from """
+    base_dir = str(settings.BASE_DIR)
+    frames = [frame for frame in stack if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename]
+    return ''.join(traceback.format_list(frames or stack[-5:]))
+
+
+def assert_flat_queries(name, small, large):
+    """ fail when the large dataset runs more queries than the small one, listing the queries that grew """
+    if len(large) <= len(small):
+        return
+
+    small_counts = Counter(sql for sql, x in small.queries)
+    large_counts = Counter(sql for sql, x in large.queries)
+    report, reported = [], set()
+    for sql, stack in large.queries:
+        if large_counts[sql] > small_counts[sql] and sql not in reported:
+            reported.add(sql)
+            report.append(f'{small_counts[sql]} -> {large_counts[sql]}: {sql}\n{format_stack(stack)}')
+    pytest.fail(f'{name}: {len(small)} queries on the small dataset, {len(large)} on the large one.\n\n'
+                + '\n'.join(report), pytrace=False)
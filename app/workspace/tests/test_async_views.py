@@ -0,0 +1,90 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from social_media.models import InstagramAccount
+
+User = get_user_model()
+
+
+def get(url, user=None, **headers):
+    """ request through the ASGI handler, the way an ASGI server calls the async views """
+    if user is not None:
+        headers['Authorization'] = f'Token {Token.objects.get_or_create(user=user)[0].key}'
+    return async_to_sync(AsyncClient().get)(url, headers=headers)
+
+
+@pytest.mark.django_db
+class TestAsyncWorkspaceViews:
+    def test_list_matches_sync_list(self, user, team, workspace):
+        workspace.users.add(User.objects.create_user(email='member@example.com', password='testpassword'))
+
+        response = get(reverse('workspace:async-workspace-list'), user)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag']
+        assert response.json()['results'] == [{
+            'name': 'Test Workspace', 'team': team.id, 'is_default': workspace.is_default, 'member_count': 1,
+            'created_at': response.json()['results'][0]['created_at'],
+            'updated_at': response.json()['results'][0]['updated_at'],
+        }]
+
+    def test_list_not_modified(self, user, team, workspace):
+        etag = get(reverse('workspace:async-workspace-list'), user)['ETag']
+
+        response = get(reverse('workspace:async-workspace-list'), user, **{'If-None-Match': etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_retrieve_as_member(self, user, team, workspace):
+        member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace.users.add(member)
+
+        response = get(reverse('workspace:async-workspace-detail', kwargs={'pk': workspace.id}), member)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['name'] == 'Test Workspace'
+        assert response.json()['users'] == [member.id]
+
+    def test_members_and_social_media_accounts(self, user, team, workspace):
+        member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace.users.add(member)
+        InstagramAccount.objects.create(access_token="a", username="test_instagram", workspace=workspace)
+
+        members = get(reverse('workspace:async-workspace-members', kwargs={'pk': workspace.id}), user)
+        accounts = get(reverse('workspace:async-workspace-social-media-accounts', kwargs={'pk': workspace.id}), user)
+
+        assert members.status_code == status.HTTP_200_OK
+        assert [row['email'] for row in members.json()['results']] == ['member@example.com']
+        assert accounts.status_code == status.HTTP_200_OK
+        assert accounts.json()['count'] == 1
+        assert accounts.json()['results'][0]['username'] == 'test_instagram'
+
+    def test_other_team_workspace_not_found(self, user, team, workspace):
+        outsider = User.objects.create_user(email='outsider@example.com', password='testpassword')
+
+        response = get(reverse('workspace:async-workspace-members', kwargs={'pk': workspace.id}), outsider)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_requires_token(self, workspace):
+        assert get(reverse('workspace:async-workspace-list')).status_code == status.HTTP_401_UNAUTHORIZED
+        response = get(reverse('workspace:async-workspace-list'), Authorization='Token invalid')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_only_get_is_allowed(self, user, team, workspace):
+        token = Token.objects.create(user=user)
+        response = async_to_sync(AsyncClient().post)(reverse('workspace:async-workspace-list'), {'name': 'New'},
+                                                     headers={'Authorization': f'Token {token.key}'})
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_invalid_cursor(self, user, team, workspace):
+        response = get(reverse('workspace:async-workspace-list') + '?cursor=invalid', user)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()['detail']
@@ -0,0 +1,146 @@
+import io
+import itertools
+import json
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app.renderers import FastJSONRenderer, FastJSONParser
+from workspace.benchmarks import time_call, time_concurrent, write_report
+from workspace.models import Workspace, WorkspaceRole, Role
+from workspace.serializers import WorkspaceListSerializer, WORKSPACE_LIST_VALUES, serialize_workspace_rows
+from workspace.services import WorkspaceService, WorkspaceDeletionService, MAX_BULK_SIZE
+
+User = get_user_model()
+
+REPORT_PATH = os.environ.get('WORKSPACE_BENCHMARK_REPORT')
+REPEAT = int(os.environ.get('WORKSPACE_BENCHMARK_REPEAT', 50))
+DATASET = {
+    'workspaces': int(os.environ.get('WORKSPACE_BENCHMARK_WORKSPACES', 50)),
+    'members': int(os.environ.get('WORKSPACE_BENCHMARK_MEMBERS', 500)),
+    'socials': int(os.environ.get('WORKSPACE_BENCHMARK_SOCIALS', 2000)),
+}
+BATCH = 10
+CONCURRENCY = int(os.environ.get('WORKSPACE_BENCHMARK_CONCURRENCY', 20))
+
+pytestmark = pytest.mark.skipif(not REPORT_PATH, reason="set WORKSPACE_BENCHMARK_REPORT to run the benchmarks")
+
+
+def build_benchmarks(team):
+    """ name -> (setup, run), `setup` builds fresh rows so that mutating calls can be repeated """
+    owner, workspace = team.owner, team.workspaces.order_by('id').first()
+    emails = (f'benchmark{team.id}.{i}@example.com' for i in itertools.count())
+    client = APIClient()
+    client.force_authenticate(user=owner)
+
+    def outsiders(count=1):
+        return User.objects.bulk_create([User(email=next(emails)) for x in range(count)])
+
+    def new_roles(count=1):
+        return WorkspaceRole.objects.bulk_create([
+            WorkspaceRole(workspace=workspace, user=user, role=Role.ANALYST) for user in outsiders(count)
+        ])
+
+    def new_workspace():
+        return Workspace.objects.create(name='Benchmark Workspace', team=team),
+
+    def url(name, pk=workspace.id):
+        return reverse(f'workspace:{name}', kwargs={'pk': pk})
+
+    # The list page as rendered by the default renderer, orjson, and orjson over `.values()` rows.
+    workspaces = Workspace.objects.filter(team=team).with_member_count()
+    members_body = json.dumps({'members': [{'user_id': i, 'role': 'ANALYST'} for i in range(MAX_BULK_SIZE)]}).encode()
+
+    return {
+        'service.can_create_workspace': (None, lambda: WorkspaceService.can_create_workspace(team.id)),
+        'service.can_add_user_to_owned_workspaces': (
+            None, lambda: WorkspaceService.can_add_user_to_owned_workspaces(owner.id)),
+        'service.can_add_social_media_account_to_owner_workspaces': (
+            None, lambda: WorkspaceService.can_add_social_media_account_to_owner_workspaces(owner.id)),
+        'service.get_users_in_workspace': (
+            None, lambda: list(WorkspaceService.get_users_in_workspace(workspace.id))),
+        'service.get_social_media_accounts_in_workspace': (
+            None, lambda: list(WorkspaceService.get_social_media_accounts_in_workspace(workspace.id))),
+        'service.create_workspace': (None, lambda: WorkspaceService.create_workspace(team.id, 'Benchmark')),
+        'service.update_workspace_name': (
+            None, lambda: WorkspaceService.update_workspace_name(workspace.id, 'Benchmark')),
+        'service.schedule_workspace_deletion': (new_workspace, lambda w: WorkspaceDeletionService.schedule(w.id)),
+        'service.add_user_to_workspace': (
+            lambda: outsiders(), lambda user: WorkspaceService.add_user_to_workspace(workspace.id, user.id, 'ANALYST')),
+        'service.add_users_to_workspace': (
+            lambda: (outsiders(BATCH),),
+            lambda users: WorkspaceService.add_users_to_workspace(
+                workspace.id, [{'user_id': user.id, 'role': 'ANALYST'} for user in users])),
+        'service.remove_user_from_workspace': (
+            lambda: new_roles(), lambda role: WorkspaceService.remove_user_from_workspace(role.id)),
+        'service.remove_users_from_workspace': (
+            lambda: (new_roles(BATCH),),
+            lambda roles: WorkspaceService.remove_users_from_workspace(workspace.id, [role.id for role in roles])),
+        'service.update_user_role_in_workspace': (
+            lambda: new_roles(), lambda role: WorkspaceService.update_user_role_in_workspace(role.id, 'ADS_MANAGER')),
+        'service.update_user_roles_in_workspace': (
+            lambda: (new_roles(BATCH),),
+            lambda roles: WorkspaceService.update_user_roles_in_workspace(
+                workspace.id, [{'workspace_role_id': role.id, 'role': 'ADS_MANAGER'} for role in roles])),
+        'view.list': (None, lambda: client.get(reverse('workspace:workspace-list'))),
+        'view.list_expand_users': (None, lambda: client.get(reverse('workspace:workspace-list'), {'expand': 'users'})),
+        'view.retrieve': (None, lambda: client.get(url('workspace-detail'))),
+        'view.create': (None, lambda: client.post(reverse('workspace:workspace-list'), {'name': 'Benchmark'})),
+        'view.update': (None, lambda: client.put(url('workspace-detail'), {'name': 'Benchmark'})),
+        'view.destroy': (new_workspace, lambda w: client.delete(url('workspace-detail', w.id))),
+        'view.user_add': (
+            lambda: outsiders(),
+            lambda user: client.post(url('workspace-user-add'), {'user_id': user.id, 'role': 'ANALYST'})),
+        'view.user_remove': (
+            lambda: new_roles(),
+            lambda role: client.post(url('workspace-user-remove'), {'workspace_role_id': role.id})),
+        'view.user_update_role': (
+            lambda: new_roles(),
+            lambda role: client.post(url('workspace-user-update-role'), {'workspace_role_id': role.id,
+                                                                          'role': 'ADS_MANAGER'})),
+        'render.list_serializer_json': (
+            None, lambda: JSONRenderer().render(WorkspaceListSerializer(workspaces.all(), many=True).data)),
+        'render.list_serializer_fast': (
+            None, lambda: FastJSONRenderer().render(WorkspaceListSerializer(workspaces.all(), many=True).data)),
+        'render.list_values_fast': (
+            None, lambda: FastJSONRenderer().render(
+                serialize_workspace_rows(workspaces.values(*WORKSPACE_LIST_VALUES)))),
+        'parse.bulk_members_json': (lambda: (io.BytesIO(members_body),), lambda body: JSONParser().parse(body)),
+        'parse.bulk_members_fast': (lambda: (io.BytesIO(members_body),), lambda body: FastJSONParser().parse(body)),
+    }
+
+
+def build_polling_benchmarks(team):
+    """
+        name -> request coroutine factory, clients polling the same reads through the ASGI handler.
+        The sync viewset runs on a worker thread per request, the async views await the database instead.
+    """
+    workspace = team.workspaces.order_by('id').first()
+    client = AsyncClient(headers={'Authorization': f'Token {Token.objects.get_or_create(user=team.owner)[0].key}'})
+    return {
+        'asgi.poll_list_sync': lambda: client.get(reverse('workspace:workspace-list')),
+        'asgi.poll_list_async': lambda: client.get(reverse('workspace:async-workspace-list')),
+        'asgi.poll_retrieve_sync': lambda: client.get(
+            reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})),
+        'asgi.poll_retrieve_async': lambda: client.get(
+            reverse('workspace:async-workspace-detail', kwargs={'pk': workspace.id})),
+    }
+
+
+@pytest.mark.django_db
+def test_workspace_benchmarks(tenant_factory):
+    team = tenant_factory(limit=10 ** 9, **DATASET)
+
+    results = {name: time_call(run, setup, repeat=REPEAT) for name, (setup, run) in build_benchmarks(team).items()}
+    results.update({name: time_concurrent(request, CONCURRENCY, repeat=max(REPEAT // 5, 1))
+                    for name, request in build_polling_benchmarks(team).items()})
+
+    report = write_report(REPORT_PATH, results, DATASET)
+    assert set(report['results']) == set(results)
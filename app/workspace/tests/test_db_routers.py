@@ -0,0 +1,53 @@
+import pytest
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.db_routers import ReplicaRouter, use_primary, use_replica, is_sticky, stick_to_primary
+from workspace.models import Workspace
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaRouter:
+    def test_reads_stay_on_default_outside_replica_block(self):
+        assert ReplicaRouter().db_for_read(Workspace) is None
+
+    def test_reads_go_to_replica(self):
+        with use_replica():
+            assert ReplicaRouter().db_for_read(Workspace) == 'replica'
+
+    def test_primary_block_is_not_downgraded(self):
+        with use_primary(), use_replica():
+            assert ReplicaRouter().db_for_read(Workspace) is None
+
+    def test_writes_of_replica_instances_go_to_default(self):
+        workspace = Workspace(name='Test Workspace')
+        workspace._state.db = 'replica'
+
+        assert ReplicaRouter().db_for_write(Workspace, instance=workspace) == 'default'
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        with use_replica():
+            assert ReplicaRouter().db_for_read(Workspace) is None
+
+    def test_sticky_after_write(self):
+        assert not is_sticky(1)
+
+        stick_to_primary(1)
+
+        assert is_sticky(1)
+        assert not is_sticky(2)
+
+
+@pytest.mark.django_db
+@override_settings(DATABASE_REPLICAS=['replica'])
+def test_write_makes_user_sticky(user, team):
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.post(reverse('workspace:workspace-list'), data={'name': 'New Workspace'})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert is_sticky(user.id)
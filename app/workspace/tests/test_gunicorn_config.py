@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import gunicorn_config
+
+
+@pytest.mark.parametrize('worker_class, profile, workers, threads', [
+    ('sync', 'io', 9, 1),
+    ('sync', 'cpu', 4, 1),
+    ('gthread', 'io', 5, 4),
+    ('gthread', 'cpu', 5, 2),
+    ('asgi', 'io', 4, 1),
+])
+def test_workers_are_sized_from_cpus_and_profile(worker_class, profile, workers, threads):
+    assert gunicorn_config.worker_count(worker_class, profile, cpus=4) == workers
+    assert gunicorn_config.thread_count(worker_class, profile) == threads
+
+
+def test_defaults_preload_a_sync_wsgi_app():
+    assert gunicorn_config.preload_app
+    assert gunicorn_config.worker_class == 'sync'
+    assert gunicorn_config.wsgi_app == 'app.wsgi:application'
+
+
+class TestMemoryRecycling:
+    def worker(self):
+        return SimpleNamespace(alive=True, pid=1, log=SimpleNamespace(info=lambda *args: None))
+
+    def test_worker_above_limit_is_finished(self, monkeypatch):
+        monkeypatch.setattr(gunicorn_config, 'max_memory_mb', 256)
+        monkeypatch.setattr(gunicorn_config, 'resident_memory_mb', lambda: 300.0)
+        worker = self.worker()
+
+        gunicorn_config.post_request(worker, None, {}, None)
+
+        assert not worker.alive
+
+    def test_worker_below_limit_keeps_serving(self, monkeypatch):
+        monkeypatch.setattr(gunicorn_config, 'max_memory_mb', 256)
+        monkeypatch.setattr(gunicorn_config, 'resident_memory_mb', lambda: 100.0)
+        worker = self.worker()
+
+        gunicorn_config.post_request(worker, None, {}, None)
+
+        assert worker.alive
+
+    def test_resident_memory_is_measured(self):
+        memory = gunicorn_config.resident_memory_mb()
+        assert memory is None or memory > 0
+
+
+def test_metrics_directory_is_set_for_the_workers_and_emptied_on_start(tmp_path, monkeypatch):
+    assert gunicorn_config.raw_env == [f'PROMETHEUS_MULTIPROC_DIR={gunicorn_config.prometheus_multiproc_dir}']
+    stale = tmp_path / 'counter_123.db'
+    stale.write_bytes(b'')
+    monkeypatch.setattr(gunicorn_config, 'prometheus_multiproc_dir', str(tmp_path))
+
+    gunicorn_config.on_starting(None)
+
+    assert not stale.exists()
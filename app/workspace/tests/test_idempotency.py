@@ -0,0 +1,77 @@
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from workspace.idempotency import idempotency_cache_keys
+from workspace.models import Workspace
+
+
+@pytest.mark.django_db
+class TestIdempotencyKey:
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def test_repeated_create_is_replayed(self, user, team):
+        client = self.client(user)
+        url = reverse('workspace:workspace-list')
+
+        first = client.post(url, {'name': 'Retried'}, HTTP_IDEMPOTENCY_KEY='create-1')
+        second = client.post(url, {'name': 'Retried'}, HTTP_IDEMPOTENCY_KEY='create-1')
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert second.data == first.data
+        assert second['Idempotent-Replayed'] == 'true'
+        assert Workspace.objects.filter(team=team, name='Retried').count() == 1
+
+    def test_requests_without_key_are_not_replayed(self, user, team):
+        client = self.client(user)
+        url = reverse('workspace:workspace-list')
+
+        client.post(url, {'name': 'Twice'})
+        client.post(url, {'name': 'Twice'})
+
+        assert Workspace.objects.filter(team=team, name='Twice').count() == 2
+
+    def test_key_reused_for_another_request(self, user, team, workspace):
+        client = self.client(user)
+        url = reverse('workspace:workspace-user-add', kwargs={'pk': workspace.id})
+
+        client.post(url, {'user_id': user.id, 'role': 'ANALYST'}, HTTP_IDEMPOTENCY_KEY='add-1')
+        response = client.post(url, {'user_id': user.id, 'role': 'ADS_MANAGER'}, HTTP_IDEMPOTENCY_KEY='add-1')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_same_data_in_another_key_order_is_replayed(self, user, team, workspace):
+        client = self.client(user)
+        url = reverse('workspace:workspace-user-add', kwargs={'pk': workspace.id})
+
+        first = client.post(url, {'user_id': user.id, 'role': 'ANALYST'}, format='json', HTTP_IDEMPOTENCY_KEY='add-2')
+        second = client.post(url, {'role': 'ANALYST', 'user_id': user.id}, format='json', HTTP_IDEMPOTENCY_KEY='add-2')
+
+        assert second.status_code == first.status_code
+        assert second['Idempotent-Replayed'] == 'true'
+
+    def test_keys_are_scoped_by_user(self, user, team):
+        assert idempotency_cache_keys(user.id, 'key') != idempotency_cache_keys(user.id + 1, 'key')
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_of_in_flight_request(self, user, team):
+        response_key, lock_key = idempotency_cache_keys(user.id, 'create-2')
+        cache.add(lock_key, 'in-flight', 60)
+
+        response = self.client(user).post(reverse('workspace:workspace-list'), {'name': 'Concurrent'},
+                                          HTTP_IDEMPOTENCY_KEY='create-2')
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert not Workspace.objects.filter(team=team, name='Concurrent').exists()
+
+    def test_invalid_key(self, user, team):
+        response = self.client(user).post(reverse('workspace:workspace-list'), {'name': 'Invalid'},
+                                          HTTP_IDEMPOTENCY_KEY='k' * 256)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,6 +1,10 @@
 import pytest
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
+from app.db_routers import use_replica
 from core.models import Team
 from workspace.models import Workspace, WorkspaceRole, Role
 
@@ -29,6 +33,51 @@ def test_create_workspace_negative():
         workspace.save()
 
 
+@pytest.mark.django_db
+def test_save_loaded_workspace_does_not_reload_it():
+    user = User.objects.create_user(email="test@example.com", password="testpassword")
+    team = Team.objects.create(name="Test Team", owner=user)
+    workspace = Workspace.objects.get(pk=Workspace.objects.create(name="Test Workspace", team=team).pk)
+    workspace.name = "Renamed Workspace"
+
+    with CaptureQueriesContext(connection) as context:
+        workspace.save()
+
+    # The workspace UPDATE and the team version bump of `workspace_saved` that invalidates cached ETags.
+    assert len(context.captured_queries) == 2
+    assert context.captured_queries[0]['sql'].startswith('UPDATE')
+    assert context.captured_queries[1]['sql'].startswith('UPDATE "workspace_teamusage"')
+
+
+@pytest.mark.django_db
+def test_update_workspace_name():
+    user = User.objects.create_user(email="test@example.com", password="testpassword")
+    team = Team.objects.create(name="Test Team", owner=user)
+    workspace = Workspace.objects.create(name="Test Workspace", team=team)
+
+    updated = Workspace.objects.update_name(workspace.pk, "Renamed Workspace")
+
+    assert updated.pk == workspace.pk
+    assert updated.name == "Renamed Workspace"
+    assert updated.team_id == team.id
+    assert updated.updated_at >= workspace.updated_at
+    assert Workspace.objects.update_name(999, "Renamed Workspace") is None
+
+
+@pytest.mark.django_db
+@override_settings(DATABASE_REPLICAS=['replica'])
+def test_update_workspace_name_inside_replica_block_writes_to_primary():
+    user = User.objects.create_user(email="test@example.com", password="testpassword")
+    team = Team.objects.create(name="Test Team", owner=user)
+    workspace = Workspace.objects.create(name="Test Workspace", team=team)
+
+    # There is no `replica` database in tests, a routed read would fail to connect.
+    with use_replica():
+        updated = Workspace.objects.update_name(workspace.pk, "Renamed Workspace")
+
+    assert updated.name == "Renamed Workspace"
+
+
 @pytest.mark.django_db
 def test_create_workspace_role_positive():
     user = User.objects.create_user(email="test@example.com", password="testpassword")
@@ -49,3 +98,37 @@ def test_create_workspace_role_negative():
 
     with pytest.raises(ValidationError):
         WorkspaceRole.objects.create(role=Role.CONTENT_CREATOR, workspace=workspace, user=user)
+
+
+@pytest.mark.django_db
+def test_create_workspace_role_other_team_negative():
+    owner = User.objects.create_user(email="owner@example.com", password="testpassword")
+    other_owner = User.objects.create_user(email="other@example.com", password="testpassword")
+    member = User.objects.create_user(email="member@example.com", password="testpassword")
+    workspace = Workspace.objects.create(name="Test Workspace", team=Team.objects.create(name="Team", owner=owner))
+    other_workspace = Workspace.objects.create(name="Other Workspace",
+                                               team=Team.objects.create(name="Other Team", owner=other_owner))
+    WorkspaceRole.objects.create(role=Role.ANALYST, workspace=workspace, user=member)
+
+    with pytest.raises(ValidationError):
+        WorkspaceRole.objects.create(role=Role.ANALYST, workspace=other_workspace, user=member)
+
+
+@pytest.mark.django_db
+def test_workspace_role_save_queries_do_not_grow_with_memberships():
+    owner = User.objects.create_user(email="owner@example.com", password="testpassword")
+    team = Team.objects.create(name="Test Team", owner=owner)
+
+    def save_queries(member, existing_memberships):
+        for i in range(existing_memberships):
+            workspace = Workspace.objects.create(name=f"Workspace {i}", team=team)
+            WorkspaceRole.objects.create(role=Role.ANALYST, workspace=workspace, user=member)
+        workspace = Workspace.objects.create(name="New Workspace", team=team)
+        with CaptureQueriesContext(connection) as context:
+            WorkspaceRole.objects.create(role=Role.ANALYST, workspace=workspace, user=member)
+        return len(context.captured_queries)
+
+    few = save_queries(User.objects.create_user(email="few@example.com", password="testpassword"), 1)
+    many = save_queries(User.objects.create_user(email="many@example.com", password="testpassword"), 10)
+
+    assert few == many
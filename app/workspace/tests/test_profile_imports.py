@@ -0,0 +1,39 @@
+import sys
+
+from app.lazy import lazy_import
+from workspace.benchmarks import heaviest_packages, import_chain, parse_importtime
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     stripe.api_resources
+import time:       400 |        500 |   stripe
+import time:        50 |        550 | subscription.models
+import time:       200 |        200 | workspace.models
+"""
+
+
+def test_parse_importtime():
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert set(timings) == {'stripe.api_resources', 'stripe', 'subscription.models', 'workspace.models'}
+    assert timings['stripe'].self_us == 400
+    assert timings['stripe'].cumulative_us == 500
+    assert timings['stripe'].importer == 'subscription.models'
+    assert timings['workspace.models'].importer is None
+
+
+def test_import_chain_and_heaviest_packages():
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert import_chain(timings, 'stripe.api_resources') == ['stripe.api_resources', 'stripe', 'subscription.models']
+    assert heaviest_packages(timings, top=2) == [('stripe', 0.5), ('workspace', 0.2)]
+
+
+def test_lazy_import_defers_execution():
+    sys.modules.pop('colorsys', None)
+
+    colorsys = lazy_import('colorsys')
+
+    # The module turns into a plain module when its first attribute is read.
+    assert type(colorsys) is not type(sys)
+    assert colorsys.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert type(colorsys) is type(sys)
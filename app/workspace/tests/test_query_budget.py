@@ -0,0 +1,117 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from workspace.cache import TwoTierCache
+from workspace.models import WorkspaceRole
+from workspace.services import WorkspaceService
+from workspace.tests.query_budget import assert_flat_queries
+
+User = get_user_model()
+
+SMALL = {'workspaces': 2, 'members': 4, 'socials': 2}
+LARGE = {'workspaces': 8, 'members': 64, 'socials': 24}
+
+
+def detail_url(name, ctx):
+    return reverse(f'workspace:{name}', kwargs={'pk': ctx['workspace'].id})
+
+
+def make_outsiders(team, count):
+    return User.objects.bulk_create([User(email=f'outsider{team.id}.{i}@example.com') for i in range(count)])
+
+
+# Each action gets a context built from one tenant and runs exactly the call that is measured.
+VIEW_ACTIONS = {
+    'list': lambda client, ctx: client.get(reverse('workspace:workspace-list')),
+    'list-expand-users': lambda client, ctx: client.get(reverse('workspace:workspace-list'), {'expand': 'users'}),
+    'retrieve': lambda client, ctx: client.get(detail_url('workspace-detail', ctx)),
+    'export': lambda client, ctx: b''.join(client.get(detail_url('workspace-export', ctx)).streaming_content),
+    'create': lambda client, ctx: client.post(reverse('workspace:workspace-list'), {'name': 'New Workspace'}),
+    'update': lambda client, ctx: client.put(detail_url('workspace-detail', ctx), {'name': 'Renamed'}),
+    'user-add': lambda client, ctx: client.post(detail_url('workspace-user-add', ctx), {
+        'user_id': ctx['outsiders'][0].id, 'role': 'ANALYST',
+    }),
+    'user-add-bulk': lambda client, ctx: client.post(detail_url('workspace-user-add-bulk', ctx), {
+        'members': [{'user_id': user.id, 'role': 'ANALYST'} for user in ctx['outsiders']],
+    }, format='json'),
+    'user-remove': lambda client, ctx: client.post(detail_url('workspace-user-remove', ctx), {
+        'workspace_role_id': ctx['roles'][0].id,
+    }),
+    'user-remove-bulk': lambda client, ctx: client.post(detail_url('workspace-user-remove-bulk', ctx), {
+        'workspace_role_ids': [role.id for role in ctx['roles']],
+    }, format='json'),
+    'user-update-role': lambda client, ctx: client.post(detail_url('workspace-user-update-role', ctx), {
+        'workspace_role_id': ctx['roles'][0].id, 'role': 'ANALYST',
+    }),
+    'user-update-role-bulk': lambda client, ctx: client.post(detail_url('workspace-user-update-role-bulk', ctx), {
+        'roles': [{'workspace_role_id': role.id, 'role': 'ANALYST'} for role in ctx['roles']],
+    }, format='json'),
+    'destroy': lambda client, ctx: client.delete(detail_url('workspace-detail', ctx)),
+}
+
+# Known growth, strict so the marker has to go once the action is fixed.
+KNOWN_GROWTH = {}
+
+SERVICE_ACTIONS = {
+    'can_create_workspace': lambda ctx: WorkspaceService.can_create_workspace(ctx['team'].id),
+    'can_add_user_to_owned_workspaces': lambda ctx: WorkspaceService.can_add_user_to_owned_workspaces(
+        ctx['team'].owner_id),
+    'can_add_social_media_account_to_owner_workspaces':
+        lambda ctx: WorkspaceService.can_add_social_media_account_to_owner_workspaces(ctx['team'].owner_id),
+    'get_users_in_workspace': lambda ctx: list(WorkspaceService.get_users_in_workspace(ctx['workspace'].id)),
+    'get_social_media_accounts_in_workspace':
+        lambda ctx: list(WorkspaceService.get_social_media_accounts_in_workspace(ctx['workspace'].id)),
+}
+
+
+def with_known_growth(names):
+    return [
+        pytest.param(name, marks=pytest.mark.xfail(strict=True, reason=KNOWN_GROWTH[name]))
+        if name in KNOWN_GROWTH else name
+        for name in names
+    ]
+
+
+def build_context(team):
+    workspace = team.workspaces.order_by('id').last()
+    return {
+        'team': team,
+        'workspace': workspace,
+        'roles': list(WorkspaceRole.objects.filter(workspace=workspace).order_by('id')[:2]),
+        'outsiders': make_outsiders(team, 2),
+    }
+
+
+def measure(query_recorder, run):
+    cache.clear()
+    TwoTierCache.clear_local()
+    recorder = query_recorder()
+    with recorder.record():
+        run()
+    return recorder
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    @pytest.mark.parametrize('name', with_known_growth(VIEW_ACTIONS))
+    def test_view_action_queries_are_flat(self, name, tenant_factory, query_recorder):
+        measured = []
+        for size in (SMALL, LARGE):
+            ctx = build_context(tenant_factory(**size))
+            client = APIClient()
+            client.force_authenticate(user=ctx['team'].owner)
+            measured.append(measure(query_recorder, lambda: VIEW_ACTIONS[name](client, ctx)))
+
+        assert_flat_queries(name, *measured)
+
+    @pytest.mark.parametrize('name', with_known_growth(SERVICE_ACTIONS))
+    def test_service_queries_are_flat(self, name, tenant_factory, query_recorder):
+        measured = []
+        for size in (SMALL, LARGE):
+            ctx = build_context(tenant_factory(**size))
+            measured.append(measure(query_recorder, lambda: SERVICE_ACTIONS[name](ctx)))
+
+        assert_flat_queries(name, *measured)
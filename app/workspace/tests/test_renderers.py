@@ -0,0 +1,42 @@
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from app.renderers import FastJSONRenderer, FastJSONParser
+
+DATA = {
+    'detail': _("Workspace created successfully."),
+    'created_at': datetime(2023, 6, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+    'results': [{'name': 'Żółw', 'team': 1, 'is_default': False, 'member_count': 0}],
+    'next': None,
+}
+
+
+class TestFastJSONRenderer:
+    def test_render_matches_json_renderer(self):
+        assert json.loads(FastJSONRenderer().render(DATA)) == json.loads(JSONRenderer().render(DATA))
+
+    def test_render_none(self):
+        assert FastJSONRenderer().render(None) == b''
+
+    def test_render_indented(self):
+        rendered = FastJSONRenderer().render(DATA, 'application/json; indent=2')
+
+        assert rendered == JSONRenderer().render(DATA, 'application/json; indent=2')
+
+
+class TestFastJSONParser:
+    def test_parse_matches_json_parser(self):
+        body = json.dumps({'members': [{'user_id': 1, 'role': 'ANALYST'}], 'name': 'Żółw'}).encode()
+
+        assert FastJSONParser().parse(io.BytesIO(body)) == JSONParser().parse(io.BytesIO(body))
+
+    def test_parse_invalid_json(self):
+        with pytest.raises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"name": '))
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from app.schema import SchemaStore
+
+
+@pytest.fixture(autouse=True)
+def clear_schema():
+    SchemaStore.clear()
+    yield
+    SchemaStore.clear()
+
+
+@pytest.mark.django_db
+class TestSchemaView:
+    def test_schema_is_served_with_etag(self, tmp_path):
+        with override_settings(OPENAPI_SCHEMA_LIVE=False, OPENAPI_SCHEMA_PATH=str(tmp_path / 'missing.json')):
+            response = Client().get(reverse('openapi-schema'))
+            not_modified = Client().get(reverse('openapi-schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert any(path.startswith('/workspace/') for path in json.loads(response.content)['paths'])
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not_modified['ETag'] == response['ETag']
+
+    def test_schema_is_generated_once(self, tmp_path):
+        with override_settings(OPENAPI_SCHEMA_LIVE=False, OPENAPI_SCHEMA_PATH=str(tmp_path / 'missing.json')):
+            Client().get(reverse('openapi-schema'))
+            swagger = SchemaStore.swagger
+            Client().get(reverse('schema-swagger-ui'))
+
+        assert swagger is not None
+        assert SchemaStore.swagger is swagger
+
+    def test_built_schema_is_served_from_disk(self, tmp_path):
+        path = tmp_path / 'openapi.json'
+        call_command('build_schema', output=str(path))
+        assert any(p.startswith('/workspace/') for p in json.loads(path.read_bytes())['paths'])
+        # Whatever the file holds is served, without generating the schema again.
+        path.write_bytes(b'{"swagger": "2.0", "paths": {}}')
+
+        with override_settings(OPENAPI_SCHEMA_LIVE=False, OPENAPI_SCHEMA_PATH=str(path)):
+            response = Client().get(reverse('openapi-schema'))
+
+        assert response.content == b'{"swagger": "2.0", "paths": {}}'
+
+    def test_swagger_ui_uses_the_built_schema(self, tmp_path, monkeypatch):
+        path = tmp_path / 'openapi.json'
+        call_command('build_schema', output=str(path))
+        monkeypatch.setattr('app.schema.generate_swagger', lambda: pytest.fail("the schema was generated again"))
+
+        with override_settings(OPENAPI_SCHEMA_LIVE=False, OPENAPI_SCHEMA_PATH=str(path)):
+            response = Client().get(reverse('schema-swagger-ui'))
+            spec = Client().get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(spec.content)['paths'] == json.loads(path.read_bytes())['paths']
+
+    def test_live_schema_is_regenerated(self, tmp_path):
+        path = tmp_path / 'openapi.json'
+        path.write_bytes(b'{"swagger": "2.0", "paths": {}}')
+
+        with override_settings(OPENAPI_SCHEMA_LIVE=True, OPENAPI_SCHEMA_PATH=str(path)):
+            response = Client().get(reverse('openapi-schema'))
+
+        assert any(path.startswith('/workspace/') for path in json.loads(response.content)['paths'])
+        assert SchemaStore.encoded is None
@@ -1,10 +1,13 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 from core.models import Team
-from workspace.models import Workspace
-from workspace.services import WorkspaceService
+from workspace.models import Workspace, WorkspaceRole, TeamUsage, Entitlement, WorkspaceDeletion, DeletionStatus
+from workspace.membership import MembershipCache, membership_cache
+from workspace.services import WorkspaceService, TeamUsageService, EntitlementService, WorkspaceDeletionService, \
+    Limits
 from social_media.models import InstagramAccount
 from subscription.models import Subscription, StripeUser, Feature, Product, ProductFeature, Price, SubscriptionItem
 
@@ -165,32 +168,6 @@ class TestWorkspaceService:
         assert not result[1]
         assert result[2] == _("Workspace name cannot be empty.")
 
-    def test_delete_workspace_with_existing_workspace(self, create_team_with_users):
-        team = create_team_with_users(num_users=1)
-        workspace = team.workspaces.create(name="Workspace to be deleted")
-
-        result = WorkspaceService.delete_workspace(workspace_id=workspace.id)
-
-        assert result[0]
-        assert result[1] == _("Workspace deleted successfully.")
-        assert not team.workspaces.filter(name="Workspace to be deleted").exists()
-
-    def test_delete_workspace_with_nonexistent_workspace(self):
-        workspace_id = 1
-
-        result = WorkspaceService.delete_workspace(workspace_id=workspace_id)
-
-        assert not result[0]
-        assert result[1] == _("Workspace not found.")
-
-    def test_delete_workspace_with_default_workspace(self, create_team_with_users):
-        team = create_team_with_users(num_users=1)
-        default_workspace = Workspace.objects.create(team=team, is_default=True, )
-
-        result = WorkspaceService.delete_workspace(workspace_id=default_workspace.id)
-        assert not result[0]
-        assert result[1] == _("Cannot delete the initial workspace.")
-
     def test_get_users_in_workspace_with_nonexistent_workspace(self):
         workspace_id = 1
 
@@ -374,3 +351,380 @@ class TestWorkspaceService:
     #     assert not success
     #     assert removed_account is None
     #     assert message == _("Social media account not found.")
+
+
+@pytest.mark.django_db
+class TestTeamUsageService:
+    def test_get_usage_counts_existing_data(self, create_team_with_users):
+        team = create_team_with_users(num_users=2)
+
+        usage = TeamUsageService.get_usage(team.id)
+
+        assert usage.workspace_count == 2
+        assert usage.distinct_member_count == 2
+        assert usage.social_account_count == 0
+
+    def test_usage_follows_workspace_writes(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        TeamUsageService.get_usage(team.id)
+
+        workspace = Workspace.objects.create(name='Another Workspace', team=team)
+        assert TeamUsage.objects.get(team=team).workspace_count == 2
+
+        workspace.delete()
+        assert TeamUsage.objects.get(team=team).workspace_count == 1
+
+    def test_usage_counts_member_once_across_workspaces(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        TeamUsageService.get_usage(team.id)
+        member = team.workspaces.first().users.first()
+        workspace = Workspace.objects.create(name='Another Workspace', team=team)
+
+        workspace.users.add(member)
+        assert TeamUsage.objects.get(team=team).distinct_member_count == 1
+
+        workspace.users.remove(member)
+        assert TeamUsage.objects.get(team=team).distinct_member_count == 1
+
+        team.workspaces.first().users.remove(member)
+        assert TeamUsage.objects.get(team=team).distinct_member_count == 0
+
+    def test_usage_follows_social_media_accounts(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        TeamUsageService.get_usage(team.id)
+        account = InstagramAccount.objects.create(username="Social Media Account 1",
+                                                  workspace=team.workspaces.first(),
+                                                  access_token="a")
+        assert TeamUsage.objects.get(team=team).social_account_count == 1
+
+        account.delete()
+        assert TeamUsage.objects.get(team=team).social_account_count == 0
+
+    def test_reconcile_repairs_drift(self, create_team_with_users):
+        team = create_team_with_users(num_users=2)
+        TeamUsageService.get_usage(team.id)
+        TeamUsage.objects.filter(team=team).update(workspace_count=10, distinct_member_count=0)
+
+        usage, drifted = TeamUsageService.reconcile(team.id)
+
+        assert drifted
+        assert usage.workspace_count == 2
+        assert usage.distinct_member_count == 2
+
+    def test_reserve_stops_at_limit(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+
+        assert TeamUsageService.reserve(team.id, 'workspace_count', limit=3)
+        assert TeamUsageService.reserve(team.id, 'workspace_count', limit=3)
+        assert not TeamUsageService.reserve(team.id, 'workspace_count', limit=3)
+        assert not TeamUsageService.reserve(team.id, 'distinct_member_count', limit=3, amount=3)
+        usage = TeamUsage.objects.get(team=team)
+        assert usage.workspace_count == 3
+        assert usage.distinct_member_count == 1
+
+    def test_reserve_with_nonexistent_team(self):
+        assert not TeamUsageService.reserve(999, 'workspace_count', limit=3)
+
+    def test_service_writes_are_counted_once(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+        user = User.objects.create_user(email='reserved@example.com', password='testpassword')
+
+        success, workspace, x = WorkspaceService.create_workspace(team_id=team.id, name='Reserved Workspace')
+        assert success
+        assert WorkspaceService.add_user_to_workspace(workspace.id, user.id, 'ANALYST')[0]
+
+        usage, drifted = TeamUsageService.reconcile(team.id)
+        assert not drifted
+        assert usage.workspace_count == 2
+        assert usage.distinct_member_count == 2
+
+    def test_reconcile_with_nonexistent_team(self):
+        usage, drifted = TeamUsageService.reconcile(999)
+
+        assert usage is None
+        assert not drifted
+
+
+@pytest.mark.django_db
+class TestWorkspaceDeletionService:
+    def test_schedule_hides_workspace(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        member = workspace.users.first()
+
+        success, deletion, message = WorkspaceDeletionService.schedule(workspace.id)
+
+        assert success
+        assert message == _("Workspace deletion scheduled.")
+        assert deletion.status == DeletionStatus.PENDING
+        assert deletion.total == 2
+        assert Workspace.objects.get(pk=workspace.id).is_pending_deletion
+        assert not MembershipCache.get(team.owner_id).can_access(workspace.id)
+        assert not MembershipCache.get(member.id).can_access(workspace.id)
+
+    def test_schedule_twice_returns_the_same_deletion(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+
+        x, first, message = WorkspaceDeletionService.schedule(workspace.id)
+        x, second, message = WorkspaceDeletionService.schedule(workspace.id)
+
+        assert first.pk == second.pk
+        assert message == _("Workspace deletion is already in progress.")
+
+    def test_schedule_nonexistent_workspace(self):
+        success, deletion, message = WorkspaceDeletionService.schedule(1)
+
+        assert not success
+        assert message == _("Workspace not found.")
+
+    def test_schedule_default_workspace(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        Workspace.objects.filter(pk=workspace.id).update(is_default=True)
+
+        success, deletion, message = WorkspaceDeletionService.schedule(workspace.id)
+
+        assert not success
+        assert message == _("Cannot delete the initial workspace.")
+        assert not WorkspaceDeletion.objects.exists()
+
+    def test_run_deletes_in_batches(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        for i in range(3):
+            workspace.users.add(User.objects.create_user(email=f'batch{i}@example.com', password='testpassword'))
+        InstagramAccount.objects.create(username="Social Media Account 1", workspace=workspace, access_token="a")
+        TeamUsageService.get_usage(team.id)
+        x, deletion, message = WorkspaceDeletionService.schedule(workspace.id)
+
+        deletion = WorkspaceDeletionService.run(deletion.pk, batch_size=2)
+
+        assert deletion.status == DeletionStatus.DONE
+        assert deletion.deleted == deletion.total == 6
+        assert not Workspace.objects.filter(pk=workspace.id).exists()
+        assert WorkspaceRole.history.filter(workspace_id=workspace.id, history_type='-').count() == 4
+        usage, drifted = TeamUsageService.reconcile(team.id)
+        assert not drifted
+        assert usage.workspace_count == 0
+        assert usage.social_account_count == 0
+
+    def test_run_nonexistent_deletion(self):
+        assert WorkspaceDeletionService.run(999) is None
+
+
+@pytest.mark.django_db
+class TestEntitlementService:
+    def test_get_limits_from_subscription_features(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+
+        limits = EntitlementService.get_limits(team.owner_id)
+
+        assert limits == Limits(max_workspaces=3, max_users=3, max_socials=3)
+        assert Entitlement.objects.filter(stripe_user__user_id=team.owner_id, max_users=3).exists()
+
+    def test_get_limits_follows_subscription_changes(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+        assert EntitlementService.get_limits(team.owner_id).max_users == 3
+
+        for item in team.owner.stripe_user.current_subscription_items:
+            item.delete()
+
+        assert EntitlementService.get_limits(team.owner_id) == Limits()
+
+    def test_get_limits_with_nonexistent_user(self):
+        assert EntitlementService.get_limits(999) == Limits()
+
+
+@pytest.mark.django_db
+class TestBulkMembership:
+    def test_add_users_to_workspace(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+        workspace = team.workspaces.first()
+        users = [User.objects.create_user(email=f'bulk{i}@example.com', password='testpassword') for i in range(2)]
+
+        success, results, message = WorkspaceService.add_users_to_workspace(
+            workspace_id=workspace.id,
+            members=[{'user_id': user.id, 'role': 'ANALYST'} for user in users],
+        )
+
+        assert success
+        assert all(result['success'] for result in results)
+        assert workspace.users.count() == 3
+        assert TeamUsageService.get_usage(team.id).distinct_member_count == 3
+
+    def test_add_users_to_workspace_reports_invalid_rows(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+        workspace = team.workspaces.first()
+        member = workspace.users.first()
+        new_user = User.objects.create_user(email='bulk@example.com', password='testpassword')
+
+        success, results, message = WorkspaceService.add_users_to_workspace(
+            workspace_id=workspace.id,
+            members=[
+                {'user_id': new_user.id, 'role': 'ANALYST'},
+                {'user_id': new_user.id, 'role': 'ANALYST'},
+                {'user_id': member.id, 'role': 'ANALYST'},
+                {'user_id': team.owner_id, 'role': 'ANALYST'},
+                {'user_id': 999, 'role': 'ANALYST'},
+                {'user_id': new_user.id, 'role': 'OWNER'},
+            ],
+        )
+
+        assert success
+        assert [result['success'] for result in results] == [True, False, False, False, False, False]
+        assert results[4]['detail'] == _("User not found.")
+        assert results[5]['detail'] == _("Invalid role.")
+        assert workspace.users.count() == 2
+
+    def test_add_users_to_workspace_with_quota_exceeded(self, create_team_with_users_and_subscription):
+        team = create_team_with_users_and_subscription(num_users=1)
+        workspace = team.workspaces.first()
+        users = [User.objects.create_user(email=f'bulk{i}@example.com', password='testpassword') for i in range(3)]
+
+        success, results, message = WorkspaceService.add_users_to_workspace(
+            workspace_id=workspace.id,
+            members=[{'user_id': user.id, 'role': 'ANALYST'} for user in users],
+        )
+
+        assert not success
+        assert message == _("Cannot add more users to workspaces owned by this user.")
+        assert not any(result['success'] for result in results)
+        assert workspace.users.count() == 1
+
+    def test_update_user_roles_in_workspace(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        workspace_role = WorkspaceRole.objects.get(workspace=workspace)
+
+        success, results, message = WorkspaceService.update_user_roles_in_workspace(
+            workspace_id=workspace.id,
+            changes=[{'workspace_role_id': workspace_role.id, 'role': 'ANALYST'},
+                     {'workspace_role_id': 999, 'role': 'ANALYST'}],
+        )
+
+        assert success
+        assert [result['success'] for result in results] == [True, False]
+        workspace_role.refresh_from_db()
+        assert workspace_role.role == 'ANALYST'
+        assert workspace_role.history.filter(history_type='~', role='ANALYST').exists()
+
+    def test_update_user_roles_in_workspace_with_malformed_ids(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        workspace_role = WorkspaceRole.objects.get(workspace=workspace)
+
+        success, results, message = WorkspaceService.update_user_roles_in_workspace(workspace.id, [
+            {'workspace_role_id': [workspace_role.id], 'role': 'ANALYST'},
+            {'workspace_role_id': {'id': workspace_role.id}, 'role': 'ANALYST'},
+            {'workspace_role_id': str(workspace_role.id), 'role': 'ANALYST'},
+        ])
+
+        assert success
+        assert [result['success'] for result in results] == [False, False, True]
+
+    def test_remove_users_from_workspace(self, create_team_with_users):
+        team = create_team_with_users(num_users=2)
+        workspace = team.workspaces.first()
+        workspace_role = WorkspaceRole.objects.get(workspace=workspace)
+        TeamUsageService.get_usage(team.id)
+
+        success, results, message = WorkspaceService.remove_users_from_workspace(
+            workspace_id=workspace.id, workspace_role_ids=[workspace_role.id, 999]
+        )
+
+        assert success
+        assert [result['success'] for result in results] == [True, False]
+        assert not WorkspaceRole.objects.filter(pk=workspace_role.id).exists()
+        assert WorkspaceRole.history.filter(id=workspace_role.id, history_type='-').exists()
+        assert TeamUsage.objects.get(team=team).distinct_member_count == 1
+
+    def test_remove_users_from_workspace_does_what_the_delete_signals_do(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        workspace.users.add(User.objects.create_user(email='bulk@example.com', password='testpassword'))
+        removed_one, removed_bulk = WorkspaceRole.objects.filter(workspace=workspace).order_by('pk')
+        TeamUsageService.get_usage(team.id)
+        assert MembershipCache.get(removed_bulk.user_id).can_access(workspace.id)
+
+        WorkspaceService.remove_user_from_workspace(removed_one.id)
+        WorkspaceService.remove_users_from_workspace(workspace_id=workspace.id, workspace_role_ids=[removed_bulk.id])
+
+        fields = ['history_type', 'id', 'user_id', 'workspace_id', 'role']
+        removals = WorkspaceRole.history.filter(history_type='-').order_by('id').values_list(*fields)
+        assert list(removals) == [('-', role.id, role.user_id, workspace.id, role.role)
+                                  for role in (removed_one, removed_bulk)]
+        assert TeamUsage.objects.get(team=team).distinct_member_count == 0
+        assert not MembershipCache.get(removed_bulk.user_id).can_access(workspace.id)
+
+    def test_add_existing_members_to_workspace_above_quota(self, create_team_with_users):
+        # Without a subscription the team has no seats, its members are already above the quota.
+        team = create_team_with_users(num_users=1)
+        member = team.workspaces.first().users.first()
+        workspace = Workspace.objects.create(name='Another Workspace', team=team)
+
+        success, results, message = WorkspaceService.add_users_to_workspace(
+            workspace_id=workspace.id, members=[{'user_id': member.id, 'role': 'ANALYST'}]
+        )
+
+        assert success
+        assert WorkspaceRole.objects.filter(workspace=workspace, user=member).exists()
+
+    def test_add_users_to_workspace_with_nonexistent_workspace(self):
+        success, results, message = WorkspaceService.add_users_to_workspace(
+            workspace_id=999, members=[{'user_id': 1, 'role': 'ANALYST'}]
+        )
+
+        assert not success
+        assert message == _("Workspace not found.")
+
+
+@pytest.mark.django_db
+class TestMembershipCache:
+    def test_owner_membership(self, create_team_with_users):
+        team = create_team_with_users(num_users=2)
+
+        membership = MembershipCache.get(team.owner_id)
+
+        assert membership.is_owner
+        assert membership.team_id == team.id
+        assert set(membership.workspace_ids) == set(team.workspaces.values_list('id', flat=True))
+
+    def test_member_membership_follows_role_changes(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        member = workspace.users.first()
+        assert MembershipCache.get(member.id).role(workspace.id) == 'SOCIAL_MEDIA_MANAGER'
+
+        workspace_role = WorkspaceRole.objects.get(workspace=workspace, user=member)
+        WorkspaceService.update_user_role_in_workspace(workspace_role.id, 'ANALYST')
+        assert MembershipCache.get(member.id).role(workspace.id) == 'ANALYST'
+
+        WorkspaceService.remove_user_from_workspace(workspace_role.id)
+        membership = MembershipCache.get(member.id)
+        assert not membership.can_access(workspace.id)
+        assert membership.team_id is None
+
+    def test_invalidation_is_repeated_after_commit(self, create_team_with_users,
+                                                    django_capture_on_commit_callbacks):
+        team = create_team_with_users(num_users=1)
+        workspace = team.workspaces.first()
+        member = workspace.users.first()
+        stale = MembershipCache.get(member.id)
+        assert stale.can_access(workspace.id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                WorkspaceRole.objects.get(workspace=workspace, user=member).delete()
+                # A concurrent request caches the membership it read before the commit.
+                membership_cache.set(member.id, stale)
+
+        assert not MembershipCache.get(member.id).can_access(workspace.id)
+
+    def test_owner_membership_follows_new_workspaces(self, create_team_with_users):
+        team = create_team_with_users(num_users=1)
+        assert len(MembershipCache.get(team.owner_id).workspace_ids) == 1
+
+        workspace = Workspace.objects.create(name='Another Workspace', team=team)
+
+        assert MembershipCache.get(team.owner_id).can_access(workspace.id)
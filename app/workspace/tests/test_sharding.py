@@ -0,0 +1,131 @@
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.db_routers import TenantShardRouter, use_shard
+from social_media.models import InstagramAccount
+from workspace.models import Workspace, WorkspaceRole, TeamUsage
+from workspace.services import WorkspaceService
+from workspace.sharding import ShardMap, TeamMoving, use_team_shard
+
+SHARDS = ['default', 'shard_1']
+
+
+@override_settings(TENANT_SHARDS=SHARDS)
+class TestTenantShardRouter:
+    def test_sharded_models_follow_the_current_shard(self):
+        with use_shard('shard_1'):
+            assert TenantShardRouter().db_for_read(Workspace) == 'shard_1'
+            assert TenantShardRouter().db_for_write(WorkspaceRole) == 'shard_1'
+
+    def test_global_models_stay_on_default(self):
+        with use_shard('shard_1'):
+            assert TenantShardRouter().db_for_read(TeamUsage) == 'default'
+
+    def test_default_shard_is_left_to_other_routers(self):
+        assert TenantShardRouter().db_for_read(Workspace) is None
+        with use_shard('default'):
+            assert TenantShardRouter().db_for_read(Workspace) is None
+
+    def test_relations_of_sharded_instances(self):
+        workspace = Workspace(name='Test Workspace')
+        workspace._state.db = 'shard_1'
+
+        assert TenantShardRouter().db_for_read(WorkspaceRole, instance=workspace) == 'shard_1'
+        assert TenantShardRouter().db_for_read(TeamUsage, instance=workspace) == 'default'
+
+    def test_only_sharded_tables_are_migrated_on_shards(self):
+        router = TenantShardRouter()
+
+        assert router.allow_migrate('shard_1', 'workspace', 'workspace')
+        assert router.allow_migrate('shard_1', 'workspace', 'historicalworkspacerole')
+        assert not router.allow_migrate('shard_1', 'workspace', 'teamusage')
+        assert router.allow_migrate('default', 'workspace', 'teamusage') is None
+
+
+def test_single_shard_needs_no_lookup():
+    assert ShardMap.get(1) == 'default'
+
+
+@override_settings(TENANT_SHARDS=SHARDS)
+@pytest.mark.django_db
+def test_frozen_team_refuses_writes(user, team, workspace):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    ShardMap.freeze(team.id)
+
+    response = client.patch(reverse('workspace:workspace-detail', kwargs={'pk': workspace.id}), {'name': 'Renamed'})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.data['detail'].code == 'team_moving'
+
+    ShardMap.unfreeze(team.id)
+    workspace.refresh_from_db()
+    assert workspace.name != 'Renamed'
+
+
+@override_settings(TENANT_SHARDS=SHARDS)
+@pytest.mark.django_db
+def test_frozen_team_refuses_writes_outside_the_views(user, team, workspace):
+    ShardMap.freeze(team.id)
+    try:
+        workspace.name = 'Renamed'
+        with pytest.raises(TeamMoving):
+            workspace.save()
+        with pytest.raises(TeamMoving):
+            workspace.users.add(user)
+    finally:
+        ShardMap.unfreeze(team.id)
+
+    workspace.save()
+
+
+@override_settings(TENANT_SHARDS=SHARDS)
+@pytest.mark.django_db
+def test_frozen_team_refuses_renames(user, team, workspace):
+    ShardMap.freeze(team.id)
+    try:
+        with pytest.raises(TeamMoving):
+            WorkspaceService.update_workspace_name(workspace.id, 'Renamed')
+    finally:
+        ShardMap.unfreeze(team.id)
+
+    workspace.refresh_from_db()
+    assert workspace.name != 'Renamed'
+
+
+@pytest.mark.skipif('shard_1' not in settings.DATABASES, reason="set IS_LOCAL and LOCAL_SHARDS=2 to test moves")
+@pytest.mark.django_db(databases=SHARDS)
+def test_move_team(user, team, workspace):
+    member = type(user).objects.create_user(email='member@example.com', password='testpassword')
+    workspace.users.add(member)
+
+    call_command('move_team', team.id, 'shard_1', settle=0)
+
+    assert ShardMap.get(team.id) == 'shard_1'
+    assert not Workspace.objects.using('default').filter(pk=workspace.id).exists()
+    assert WorkspaceRole.objects.using('shard_1').filter(workspace_id=workspace.id, user=member).exists()
+    assert WorkspaceRole.history.using('shard_1').filter(workspace_id=workspace.id).exists()
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.get(reverse('workspace:workspace-detail', kwargs={'pk': workspace.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['users'] == [member.id]
+
+
+@pytest.mark.skipif('shard_1' not in settings.DATABASES, reason="set IS_LOCAL and LOCAL_SHARDS=2 to test moves")
+@pytest.mark.django_db(databases=SHARDS)
+def test_unattached_account_moves_to_the_team_shard(user, team, workspace):
+    call_command('move_team', team.id, 'shard_1', settle=0)
+    account = InstagramAccount.objects.create(username='unattached', access_token='a')
+
+    with use_team_shard(team.id):
+        success, account, message = WorkspaceService.add_social_media_account_to_workspace(workspace.id, account.id)
+
+    assert success
+    assert InstagramAccount.objects.using('shard_1').filter(pk=account.pk, workspace_id=workspace.id).exists()
+    assert not InstagramAccount.objects.using('default').filter(pk=account.pk).exists()
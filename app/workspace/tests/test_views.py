@@ -1,10 +1,21 @@
+import csv
+import io
+import json
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from workspace.models import WorkspaceRole
+from core.models import Team
+from workspace.authentication import token_cache, token_cache_key
+from workspace.models import Workspace, WorkspaceRole
+from workspace.serializers import WorkspaceListSerializer
+from workspace.services import TeamUsageService, WorkspaceDeletionService
 from social_media.models import SocialMediaPlatform, InstagramAccount
 
 User = get_user_model()
@@ -20,8 +31,8 @@ class TestWorkspaceViewSet:
         response = client.get(url)
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 1
-        assert response.data[0]['name'] == 'Test Workspace'
+        assert len(response.data['results']) == 1
+        assert response.data['results'][0]['name'] == 'Test Workspace'
 
     def test_list_workspaces_as_team_member(self, user, team, workspace):
         team_member = User.objects.create_user(email='member@example.com', password='testpassword')
@@ -34,8 +45,176 @@ class TestWorkspaceViewSet:
         response = client.get(url)
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 1
-        assert response.data[0]['name'] == 'Test Workspace'
+        assert len(response.data['results']) == 1
+        assert response.data['results'][0]['name'] == 'Test Workspace'
+
+    def test_list_workspaces_member_count_and_expand(self, user, team, workspace):
+        team_member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace.users.add(team_member)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-list')
+        response = client.get(url)
+        assert response.data['results'][0]['member_count'] == 1
+        assert 'users' not in response.data['results'][0]
+
+        response = client.get(url, {'expand': 'users'})
+        assert response.data['results'][0]['users'] == [team_member.id]
+
+    def test_list_workspaces_matches_list_serializer(self, user, team, workspace):
+        workspace.users.add(User.objects.create_user(email='member@example.com', password='testpassword'))
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.get(reverse('workspace:workspace-list'))
+
+        expected = WorkspaceListSerializer(Workspace.objects.filter(team=team).with_member_count(), many=True).data
+        assert json.loads(response.content)['results'] == json.loads(json.dumps(expected))
+
+    def test_list_workspaces_paginated(self, user, team, workspace):
+        for i in range(4):
+            Workspace.objects.create(name=f'Workspace {i}', team=team)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-list')
+        names = []
+        response = client.get(url, {'page_size': 2})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            names += [item['name'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = client.get(response.data['next'])
+
+        assert names == ['Test Workspace', 'Workspace 0', 'Workspace 1', 'Workspace 2', 'Workspace 3']
+
+    def test_list_workspaces_invalid_cursor(self, user, team, workspace):
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-list')
+        response = client.get(url, {'cursor': 'invalid'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_workspaces_not_modified(self, user, team, workspace):
+        TeamUsageService.get_usage(team.id)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-list')
+        response = client.get(url)
+        etag = response['ETag']
+        assert etag.startswith('W/')
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        workspace.name = 'Renamed Workspace'
+        workspace.save()
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_retrieve_workspace_not_modified_after_membership_change(self, user, team, workspace):
+        TeamUsageService.get_usage(team.id)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})
+        etag = client.get(url)['ETag']
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        workspace.users.add(User.objects.create_user(email='member@example.com', password='testpassword'))
+
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_list_workspaces_server_timing(self, settings, user, team, workspace):
+        settings.PERFORMANCE_INSTRUMENTATION = {'SAMPLE_RATE': 1, 'SLOW_REQUEST_MS': 10000}
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.get(reverse('workspace:workspace-list'))
+
+        assert response.status_code == status.HTTP_200_OK
+        timing = response['Server-Timing']
+        assert 'db;dur=' in timing
+        assert 'view;dur=' in timing
+        assert 'render;dur=' in timing
+
+    def test_metrics_endpoint_exposes_request_metrics(self, settings, user, team, workspace):
+        settings.PERFORMANCE_INSTRUMENTATION = {'METRICS': True}
+        settings.METRICS_TOKEN = 'secret'
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.get(reverse('workspace:workspace-list'))
+
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert b'http_request_duration_seconds_bucket{action="WorkspaceViewSet.list"' in response.content
+        assert b'workspace_quota_checks' in response.content
+        assert client.get(reverse('metrics')).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_metrics_endpoint_is_closed_without_token(self, settings):
+        settings.METRICS_TOKEN = None
+
+        assert APIClient().get(reverse('metrics')).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_token_authentication_is_cached(self, user, team, workspace):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = reverse('workspace:workspace-list')
+        assert client.get(url).status_code == status.HTTP_200_OK
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not [query for query in context.captured_queries if 'authtoken_token' in query['sql']]
+
+    def test_token_authentication_cache_invalidation(self, user, team, workspace):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = reverse('workspace:workspace-list')
+        assert client.get(url).status_code == status.HTTP_200_OK
+
+        user.is_active = False
+        user.save()
+        assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+        user.is_active = True
+        user.save()
+        assert client.get(url).status_code == status.HTTP_200_OK
+
+        token.delete()
+        assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_token_invalidation_is_repeated_after_commit(self, user, team, workspace,
+                                                         django_capture_on_commit_callbacks):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        url = reverse('workspace:workspace-list')
+        assert client.get(url).status_code == status.HTTP_200_OK
+        stale = Token.objects.select_related('user').get(pk=token.pk)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                user.is_active = False
+                user.save()
+                # A concurrent request authenticates before the commit and caches the active user.
+                token_cache.set(token_cache_key(token.key), stale)
+
+        assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
 
     def test_list_workspaces_unauthenticated(self, user, team, workspace):
         client = APIClient()
@@ -89,6 +268,20 @@ class TestWorkspaceViewSet:
 
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
+    def test_update_workspace_of_another_team_as_owner(self, user, team, workspace):
+        other_owner = User.objects.create_user(email='otherowner@example.com', password='testpassword')
+        Team.objects.create(name='Other Team', owner=other_owner)
+
+        client = APIClient()
+        client.force_authenticate(user=other_owner)
+
+        url = reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})
+        response = client.put(url, data={'name': 'Updated Workspace'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        workspace.refresh_from_db()
+        assert workspace.name == 'Test Workspace'
+
     def test_create_workspace_as_owner(self, user, team):
         client = APIClient()
         client.force_authenticate(user=user)
@@ -116,7 +309,37 @@ class TestWorkspaceViewSet:
         url = reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})
         response = client.delete(url)
 
-        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['status'] == 'PENDING'
+        assert response['Location'].endswith(
+            reverse('workspace:workspace-deletion', kwargs={'deletion_id': response.data['id']}))
+        assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+        assert not client.get(reverse('workspace:workspace-list')).data['results']
+
+    def test_workspace_deletion_status(self, user, team, workspace):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        deletion_id = client.delete(reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})).data['id']
+        WorkspaceDeletionService.run(deletion_id)
+
+        response = client.get(reverse('workspace:workspace-deletion', kwargs={'deletion_id': deletion_id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'DONE'
+        assert response.data['deleted'] == response.data['total']
+        assert not Workspace.objects.filter(pk=workspace.id).exists()
+
+    def test_workspace_deletion_status_of_another_team(self, user, team, workspace):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        deletion_id = client.delete(reverse('workspace:workspace-detail', kwargs={'pk': workspace.id})).data['id']
+        other_owner = User.objects.create_user(email='otherowner@example.com', password='testpassword')
+        Team.objects.create(name='Other Team', owner=other_owner)
+        client.force_authenticate(user=other_owner)
+
+        response = client.get(reverse('workspace:workspace-deletion', kwargs={'deletion_id': deletion_id}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
     def test_add_user_to_workspace_as_owner(self, user, team, workspace):
         new_user = User.objects.create_user(email='newuser@example.com', password='testpassword')
@@ -132,6 +355,20 @@ class TestWorkspaceViewSet:
         assert workspace_role
         assert workspace_role.role == role
 
+    def test_add_users_bulk_to_workspace_as_owner(self, user, team, workspace):
+        new_users = [User.objects.create_user(email=f'new{i}@example.com', password='testpassword') for i in range(2)]
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-user-add-bulk', kwargs={'pk': workspace.id})
+        members = [{'user_id': new_user.id, 'role': 'ANALYST'} for new_user in new_users]
+        response = client.post(url, data={'members': members}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 2
+        assert WorkspaceRole.objects.filter(workspace=workspace, role='ANALYST').count() == 2
+
     def test_remove_user_from_workspace_as_owner(self, user, team, workspace):
         team_member = User.objects.create_user(email='member@example.com', password='testpassword')
         workspace_role = WorkspaceRole.objects.create(workspace=workspace, user=team_member, role='member')
@@ -145,6 +382,80 @@ class TestWorkspaceViewSet:
         assert response.status_code == status.HTTP_200_OK
         assert team_member not in workspace.users.all()
 
+    def test_remove_user_of_another_workspace(self, user, team, workspace):
+        other_workspace = Workspace.objects.create(name='Other Workspace', team=team)
+        team_member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace_role = WorkspaceRole.objects.create(workspace=other_workspace, user=team_member, role='ANALYST')
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.post(reverse('workspace:workspace-user-remove', kwargs={'pk': workspace.id}),
+                               data={'workspace_role_id': workspace_role.id})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.post(reverse('workspace:workspace-user-update-role', kwargs={'pk': workspace.id}),
+                               data={'workspace_role_id': workspace_role.id, 'role': 'ADS_MANAGER'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        workspace_role.refresh_from_db()
+        assert workspace_role.role == 'ANALYST'
+
+    def test_export_workspace_as_csv(self, user, team, workspace):
+        member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace.users.add(member, through_defaults={'role': 'ANALYST'})
+        InstagramAccount.objects.create(access_token="a", username="test_instagram", workspace=workspace)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-export', kwargs={'pk': workspace.id})
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert [row['type'] for row in rows] == ['member', 'social_media_account']
+        assert rows[0]['email'] == 'member@example.com'
+        assert rows[0]['role'] == 'ANALYST'
+        assert rows[1]['username'] == 'test_instagram'
+
+    def test_export_workspace_as_ndjson_as_member(self, user, team, workspace):
+        member = User.objects.create_user(email='member@example.com', password='testpassword')
+        workspace.users.add(member)
+
+        client = APIClient()
+        client.force_authenticate(user=member)
+
+        url = reverse('workspace:workspace-export', kwargs={'pk': workspace.id})
+        response = client.get(url, {'output': 'ndjson'})
+
+        assert response.status_code == status.HTTP_200_OK
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert records == [{
+            'type': 'member', 'id': member.id, 'email': 'member@example.com', 'first_name': member.first_name,
+            'last_name': member.last_name, 'role': 'SOCIAL_MEDIA_MANAGER', 'joined_at': records[0]['joined_at'],
+        }]
+
+    def test_export_workspace_with_unsupported_format(self, user, team, workspace):
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        url = reverse('workspace:workspace-export', kwargs={'pk': workspace.id})
+        response = client.get(url, {'output': 'xml'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_export_workspace_as_non_member(self, user, team, workspace):
+        non_member = User.objects.create_user(email='nonmember@example.com', password='testpassword')
+
+        client = APIClient()
+        client.force_authenticate(user=non_member)
+
+        url = reverse('workspace:workspace-export', kwargs={'pk': workspace.id})
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
     #TODO:
     # def test_list_social_media_accounts_authenticated_owner(self, user, team, workspace):
     #     instagram_account = InstagramAccount.objects.create(
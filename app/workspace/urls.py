@@ -1,9 +1,19 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from workspace.async_views import AsyncWorkspaceListView, AsyncWorkspaceDetailView, AsyncWorkspaceMembersView, \
+    AsyncWorkspaceSocialMediaAccountsView
 from workspace.views import WorkspaceViewSet
 
 router = DefaultRouter()
 router.register('', WorkspaceViewSet, basename='workspace')
 
 app_name = "workspace"
-urlpatterns = [] + router.urls
+# Async read endpoints for ASGI deployments, ahead of the router whose detail route would match `async/`.
+urlpatterns = [
+    path('async/', AsyncWorkspaceListView.as_view(), name='async-workspace-list'),
+    path('async/<int:pk>/', AsyncWorkspaceDetailView.as_view(), name='async-workspace-detail'),
+    path('async/<int:pk>/members/', AsyncWorkspaceMembersView.as_view(), name='async-workspace-members'),
+    path('async/<int:pk>/social-media-accounts/', AsyncWorkspaceSocialMediaAccountsView.as_view(),
+         name='async-workspace-social-media-accounts'),
+] + router.urls
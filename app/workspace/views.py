@@ -1,14 +1,46 @@
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from core.permissions import IsTeamOwner
-from workspace.models import Workspace
-from workspace.serializers import WorkspaceSerializer
+from app.db_routers import PRIMARY, REPLICA, current_shard, get_shard, is_sticky, read_target, set_read_target, \
+    stick_to_primary
+from workspace.export import EXPORT_FORMATS, stream_workspace_export
+from workspace.idempotency import idempotent
+from workspace.membership import MembershipCache
+from workspace.models import Workspace, WorkspaceRole, WorkspaceDeletion
+from workspace.pagination import KeysetPagination
+from workspace.permissions import IsWorkspaceTeamOwner
+from workspace.serializers import WorkspaceSerializer, WorkspaceListSerializer, WorkspaceExpandedListSerializer, \
+    WorkspaceDeletionSerializer, WORKSPACE_LIST_VALUES, serialize_workspace_rows
 
-from workspace.services import WorkspaceService
+from workspace.services import WorkspaceService, TeamUsageService, WorkspaceDeletionService
+from workspace.sharding import ShardMap, TeamMoving, current_team
+
+
+def get_cache_validators(team_id, user_id):
+    """ weak ETag and Last-Modified of the user's team, read from its version counter """
+    team_version = TeamUsageService.get_version(team_id) if team_id else None
+    if not team_version:
+        return None, None
+    version, updated_at = team_version
+    return f'W/"{team_id}.{version}.{user_id}"', int(updated_at.timestamp())
+
+
+def patch_cache_validators(response, cache_validators):
+    etag, last_modified = cache_validators
+    if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 class WorkspaceViewSet(viewsets.GenericViewSet):
@@ -17,35 +49,117 @@ class WorkspaceViewSet(viewsets.GenericViewSet):
     """
     serializer_class = WorkspaceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'destroy']:
-            self.permission_classes = [IsAuthenticated, IsTeamOwner]
+            self.permission_classes = [IsAuthenticated, IsWorkspaceTeamOwner]
         return super(WorkspaceViewSet, self).get_permissions()
 
+    def get_membership(self):
+        return MembershipCache.get(self.request.user.id)
+
+    def get_accessible_pk(self):
+        """ pk of the detail route, checked against the cached membership instead of loading the workspace """
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not self.get_membership().can_access(pk):
+            raise NotFound(_("Workspace not found."))
+        return int(pk)
+
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Workspace.objects.none()
-        if hasattr(self.request.user, "owned_team"):
-            return Workspace.objects.filter(team=self.request.user.owned_team)
-        return Workspace.objects.filter(users__in=[self.request.user])
+        membership = self.get_membership()
+        workspaces = Workspace.objects.filter(is_pending_deletion=False)
+        if membership.is_owner:
+            return workspaces.filter(team_id=membership.team_id)
+        return workspaces.filter(pk__in=list(membership.workspace_ids))
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            if self.expand_users():
+                return WorkspaceExpandedListSerializer
+            return WorkspaceListSerializer
+        return super(WorkspaceViewSet, self).get_serializer_class()
+
+    def expand_users(self):
+        return 'users' in self.request.query_params.get('expand', '').split(',')
+
+    def get_cache_validators(self):
+        return get_cache_validators(self.get_membership().team_id, self.request.user.id)
+
+    def get_not_modified_response(self):
+        self.cache_validators = self.get_cache_validators()
+        etag, last_modified = self.cache_validators
+        if not etag:
+            return None
+        return get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions run on the primary, they fill the token and membership caches.
+        super(WorkspaceViewSet, self).initial(request, *args, **kwargs)
+        user_id = request.user.id
+        team_id = self.get_membership().team_id if user_id else None
+        if request.method not in SAFE_METHODS and ShardMap.is_frozen(team_id):
+            raise TeamMoving()
+        replica = request.method in SAFE_METHODS and not is_sticky(user_id)
+        self.read_target_token = set_read_target(REPLICA if replica else PRIMARY)
+        self.shard_token = current_shard.set(ShardMap.get(team_id))
+        self.team_token = current_team.set(team_id)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'read_target_token', None)
+        if token is not None:
+            read_target.reset(token)
+            self.read_target_token = None
+        token = getattr(self, 'shard_token', None)
+        if token is not None:
+            current_shard.reset(token)
+            self.shard_token = None
+        token = getattr(self, 'team_token', None)
+        if token is not None:
+            current_team.reset(token)
+            self.team_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            stick_to_primary(getattr(request.user, 'id', None))
+
+        response = super(WorkspaceViewSet, self).finalize_response(request, response, *args, **kwargs)
+        return patch_cache_validators(response, getattr(self, 'cache_validators', (None, None)))
 
     def list(self, request):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        not_modified = self.get_not_modified_response()
+        if not_modified:
+            return not_modified
+
+        queryset = self.get_queryset().with_member_count()
+        if not self.expand_users():
+            # Read-only rows are built straight from `.values()`, skipping the per-field serializer machinery.
+            page = self.paginate_queryset(queryset.values(*WORKSPACE_LIST_VALUES))
+            return self.get_paginated_response(serialize_workspace_rows(page))
+
+        roles = Prefetch('roles', WorkspaceRole.objects.order_by('pk'))
+        page = self.paginate_queryset(queryset.prefetch_related(roles))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, pk=None):
-        queryset = self.get_queryset().filter(pk=pk)
-        if not queryset.exists():
+        if not self.get_membership().can_access(pk):
+            return Response({'detail': 'Workspace not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        not_modified = self.get_not_modified_response()
+        if not_modified:
+            return not_modified
+
+        workspace = self.get_queryset().filter(pk=pk).first()
+        if not workspace:
             return Response({'detail': 'Workspace not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        workspace = queryset.first()
         serializer = self.get_serializer(workspace)
         return Response(serializer.data)
 
+    @idempotent
     def create(self, request):
-        team_id = request.user.owned_team.id
+        team_id = self.get_membership().team_id
         name = request.data['name']
 
         success, workspace, message = WorkspaceService.create_workspace(team_id, name)
@@ -54,7 +168,10 @@ class WorkspaceViewSet(viewsets.GenericViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response({'detail': message}, status=status.HTTP_403_FORBIDDEN)
 
+    @idempotent
     def update(self, request, pk=None):
+        if not self.get_membership().can_access(pk):
+            return Response({'detail': _("Workspace not found.")}, status=status.HTTP_404_NOT_FOUND)
         new_name = request.data['name']
 
         success, workspace, message = WorkspaceService.update_workspace_name(pk, new_name)
@@ -63,16 +180,44 @@ class WorkspaceViewSet(viewsets.GenericViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response({'detail': message}, status=status.HTTP_403_FORBIDDEN)
 
+    @idempotent
     def destroy(self, request, pk=None):
-        success, message = WorkspaceService.delete_workspace(pk)
+        if not self.get_membership().can_access(pk):
+            return Response({'detail': _("Workspace not found.")}, status=status.HTTP_404_NOT_FOUND)
+        success, deletion, message = WorkspaceDeletionService.schedule(pk)
         if success:
-            return Response({'detail': message}, status=status.HTTP_204_NO_CONTENT)
+            location = reverse('workspace:workspace-deletion', kwargs={'deletion_id': deletion.pk}, request=request)
+            return Response(WorkspaceDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED,
+                            headers={'Location': location})
         return Response({'detail': message}, status=status.HTTP_403_FORBIDDEN)
 
+    @action(detail=False, methods=['get'], url_path=r'deletions/(?P<deletion_id>[0-9]+)', url_name='deletion',
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    def deletion(self, request, deletion_id=None):
+        """ progress of a deletion started by `destroy` """
+        deletion = WorkspaceDeletion.objects.filter(pk=deletion_id, team_id=self.get_membership().team_id).first()
+        if not deletion:
+            return Response({'detail': _("Workspace deletion not found.")}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WorkspaceDeletionSerializer(deletion).data)
+
+    @action(detail=True, methods=['get'], url_path='export', url_name='export')
+    def export(self, request, *args, **kwargs):
+        """ stream members, roles and social media accounts, `?output=csv` (default) or `?output=ndjson` """
+        pk = self.get_accessible_pk()
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'detail': _("Unsupported export format.")}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_workspace_export(pk, export_format, get_shard()),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="workspace-{pk}.{export_format}"'
+        return response
+
     @action(detail=True, methods=['post'], url_path='user-add', url_name='user-add',
-            permission_classes=[IsAuthenticated, IsTeamOwner])
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
     def add_user(self, request, *args, **kwargs):
-        pk = self.get_object().id
+        pk = self.get_accessible_pk()
         user_id = request.data.get('user_id')
         role = request.data.get('role')
         success, workspace_role, message = WorkspaceService.add_user_to_workspace(pk, user_id, role)
@@ -80,25 +225,63 @@ class WorkspaceViewSet(viewsets.GenericViewSet):
             return Response({'detail': message}, status=status.HTTP_200_OK)
         return Response({'detail': message}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'], url_path='user-add-bulk', url_name='user-add-bulk',
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
+    def add_users_bulk(self, request, *args, **kwargs):
+        pk = self.get_accessible_pk()
+        members = request.data.get('members')
+        success, results, message = WorkspaceService.add_users_to_workspace(pk, members)
+        if success:
+            return Response({'detail': message, 'results': results}, status=status.HTTP_200_OK)
+        return Response({'detail': message, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=['post'], url_path='user-remove', url_name='user-remove',
-            permission_classes=[IsAuthenticated, IsTeamOwner])
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
     def remove_user(self, request, *args, **kwargs):
+        pk = self.get_accessible_pk()
         workspace_role_id = request.data.get('workspace_role_id')
 
-        success, message = WorkspaceService.remove_user_from_workspace(workspace_role_id)
+        success, message = WorkspaceService.remove_user_from_workspace(workspace_role_id, workspace_id=pk)
 
         if success:
             return Response({'detail': message}, status=status.HTTP_200_OK)
         return Response({'detail': message}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'], url_path='user-update-role', url_name='user-update-role',
-            permission_classes=[IsAuthenticated, IsTeamOwner])
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
     def update_user_role(self, request, *args, **kwargs):
+        pk = self.get_accessible_pk()
         workspace_role_id = request.data.get('workspace_role_id')
         role = request.data.get('role')
 
-        success, workspace_role, message = WorkspaceService.update_user_role_in_workspace(workspace_role_id, role)
+        success, workspace_role, message = WorkspaceService.update_user_role_in_workspace(workspace_role_id, role,
+                                                                                          workspace_id=pk)
 
         if success:
             return Response({'detail': message}, status=status.HTTP_200_OK)
         return Response({'detail': message}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'], url_path='user-update-role-bulk', url_name='user-update-role-bulk',
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
+    def update_user_roles_bulk(self, request, *args, **kwargs):
+        pk = self.get_accessible_pk()
+        roles = request.data.get('roles')
+        success, results, message = WorkspaceService.update_user_roles_in_workspace(pk, roles)
+        if success:
+            return Response({'detail': message, 'results': results}, status=status.HTTP_200_OK)
+        return Response({'detail': message, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'], url_path='user-remove-bulk', url_name='user-remove-bulk',
+            permission_classes=[IsAuthenticated, IsWorkspaceTeamOwner])
+    @idempotent
+    def remove_users_bulk(self, request, *args, **kwargs):
+        pk = self.get_accessible_pk()
+        workspace_role_ids = request.data.get('workspace_role_ids')
+        success, results, message = WorkspaceService.remove_users_from_workspace(pk, workspace_role_ids)
+        if success:
+            return Response({'detail': message, 'results': results}, status=status.HTTP_200_OK)
+        return Response({'detail': message, 'results': results}, status=status.HTTP_400_BAD_REQUEST)